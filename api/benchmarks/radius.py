@@ -0,0 +1,73 @@
+"""
+Radius query plans: the bounding box on the display columns against
+ST_DWithin on listings.geog (SPATIAL_BACKEND=postgis).
+
+    python -m benchmarks.radius                  # around the configured database's first listing
+    python -m benchmarks.radius 40.7128 -74.0060 # around a given point
+
+Prints EXPLAIN (ANALYZE, BUFFERS) for the first page of a radius query at
+each of RADII under both backends. Needs the listings_geography and
+listings_display_coords migrations. To try it at scale on a scratch
+database, copy an existing listing:
+
+    INSERT INTO listings (id, title, description, price, currency, category, condition, status,
+                          views, seller_id, images, latitude, longitude,
+                          display_latitude, display_longitude, created_at, updated_at)
+    SELECT gen_random_uuid(), title, description, price, currency, category, condition, status,
+           0, seller_id, images, lat, lon, lat, lon, now(), now()
+    FROM (SELECT *, 25 + random() * 24 AS lat, -124 + random() * 57 AS lon
+          FROM listings LIMIT 1) src, generate_series(1, 1000000);
+    UPDATE listings SET geog = ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326)::geography
+    WHERE geog IS NULL;
+    ANALYZE listings;
+"""
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+import routers.listings as listings
+from db.database import SessionLocal
+from models import Listings
+
+RADII = (1, 5, 25, 100)
+PAGE_SIZE = 50
+
+
+def radius_page_sql(db, lat: float, lon: float, dist: float, backend: str) -> str:
+    saved = listings.SPATIAL_BACKEND
+    listings.SPATIAL_BACKEND = backend
+    try:
+        query = listings.filter_by_location(listings.feed_query(db), lat, lon, dist)
+    finally:
+        listings.SPATIAL_BACKEND = saved
+    statement = (
+        query.order_by(Listings.created_at.desc(), Listings.id.desc())
+        .limit(PAGE_SIZE + 1)
+        .statement
+    )
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def main(args):
+    db = SessionLocal()
+    try:
+        if args:
+            lat, lon = float(args[0]), float(args[1])
+        else:
+            lat, lon = map(float, db.query(Listings.latitude, Listings.longitude).first())
+
+        for dist in RADII:
+            for backend in ('bbox', 'postgis'):
+                print(f"== {backend}, {dist} miles around ({lat}, {lon})")
+                sql = radius_page_sql(db, lat, lon, dist, backend)
+                for (line,) in db.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql)):
+                    print(f"  {line}")
+                print()
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
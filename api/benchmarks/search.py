@@ -0,0 +1,96 @@
+"""
+Search latency: the ilike path in Postgres against the in-memory BM25 index
+(SEARCH_BACKEND=memory).
+
+    python -m benchmarks.search                    # both, over the configured database
+    python -m benchmarks.search --synthetic 100000 # index only, over generated listings
+
+Each query is timed REPEAT times and the median reported. The ilike timing
+is the query search_listing runs without a ranked backend (first page,
+newest first); the index timing is the SearchIndex.search call
+memory_search_page makes for a first page.
+"""
+import itertools
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from sqlalchemy import or_
+
+from services.search_index import SearchIndex
+from services.search_service import MEMORY_CANDIDATE_BATCH, MEMORY_MAX_CANDIDATE_BATCHES
+
+QUERIES = ('bike', 'desk lamp', 'calculus textbook', 'iphone charger', 'winter jacket', 'mini fridge')
+REPEAT = 20
+PAGE_SIZE = 50
+CANDIDATES = MEMORY_CANDIDATE_BATCH * MEMORY_MAX_CANDIDATE_BATCHES
+
+# Synthetic listings draw words Zipf-distributed from a vocabulary that
+# includes the query words at moderately common ranks
+VOCABULARY_SIZE = 20000
+
+
+def median_ms(run) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def synthetic_index(count: int) -> SearchIndex:
+    rng = random.Random(0)
+    vocabulary = [f"word{rank}" for rank in range(VOCABULARY_SIZE)]
+    query_words = sorted({word for q in QUERIES for word in q.split()})
+    for position, word in enumerate(query_words):
+        vocabulary[50 + position * 40] = word
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+
+    index = SearchIndex()
+    for _ in range(count):
+        title, description, tags = (rng.choices(vocabulary, cum_weights=weights, k=k) for k in (5, 40, 3))
+        index.add(uuid.uuid4(), ' '.join(title), ' '.join(description), tags)
+    return index
+
+
+def ilike_page(db, q: str):
+    from models import Listings
+
+    return (
+        db.query(Listings.id)
+        .filter(or_(Listings.title.ilike(f"%{q}%"), Listings.description.ilike(f"%{q}%")))
+        .order_by(Listings.created_at.desc(), Listings.id.desc())
+        .limit(PAGE_SIZE + 1)
+        .all()
+    )
+
+
+def main(args):
+    if args[:1] == ['--synthetic']:
+        count = int(args[1]) if len(args) > 1 else 100000
+        index = synthetic_index(count)
+        print(f"{len(index)} synthetic listings")
+        for q in QUERIES:
+            print(f"  {q!r:20} index {median_ms(lambda: index.search(q, limit=CANDIDATES)):8.3f} ms")
+        return
+
+    from db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        index = SearchIndex()
+        index.rebuild(db)
+        print(f"{len(index)} listings")
+        for q in QUERIES:
+            ilike = median_ms(lambda: ilike_page(db, q))
+            memory = median_ms(lambda: index.search(q, limit=CANDIDATES))
+            print(f"  {q!r:20} ilike {ilike:8.3f} ms   index {memory:8.3f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
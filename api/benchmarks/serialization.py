@@ -0,0 +1,99 @@
+"""
+Feed page serialization: the old dict + pydantic seller + jsonable_encoder
+path against format_listing with the orjson FastJSONResponse.
+
+    python -m benchmarks.serialization          # 1000-listing page
+    python -m benchmarks.serialization 5000
+
+Listings and sellers are built in memory, so no database is needed. Both
+sides start from loaded ORM rows and end at the response body bytes; each is
+timed REPEAT times and the median reported.
+"""
+import datetime
+import decimal
+import statistics
+import sys
+import time
+import uuid
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from models import Listings, Users
+from routers.listings import format_listing, listing_display_coords
+from services.responses import FastJSONResponse
+
+REPEAT = 20
+
+# The listing columns and seller model responses were built from before the slotted types
+OLD_LISTING_FIELDS = ('id', 'title', 'description', 'price', 'currency', 'category', 'condition',
+                      'status', 'views', 'seller_id', 'images', 'created_at', 'updated_at',
+                      'latitude', 'longitude', 'location', 'tags')
+
+
+class User(BaseModel):
+    id: uuid.UUID
+    fname: str
+    lname: str
+    email: str
+    pfp_url: Optional[list[str]] = None
+
+
+def old_format_listing(listing: Listings, seller: Users):
+    listing_data = {field: getattr(listing, field) for field in OLD_LISTING_FIELDS}
+    listing_data["latitude"], listing_data["longitude"] = listing_display_coords(listing)
+    seller_model = User(id=seller.id, fname=seller.fname, lname=seller.lname, email=seller.email, pfp_url=seller.pfp_url)
+    return {"listing": listing_data, "seller": seller_model, "dist_away": None}
+
+
+def old_page(rows) -> bytes:
+    page = {"listings": [old_format_listing(listing, seller) for listing, seller in rows], "next_cursor": None}
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+def new_page(rows) -> bytes:
+    page = {"listings": [format_listing(listing, seller) for listing, seller in rows], "next_cursor": None}
+    return FastJSONResponse(page).body
+
+
+def sample_rows(count: int):
+    now = datetime.datetime(2026, 1, 1)
+    rows = []
+    for n in range(count):
+        seller = Users(id=uuid.uuid4(), fname="Sam", lname=f"Seller{n}", email=f"seller{n}@example.edu",
+                       pfp_url=[f"https://bucket.s3.amazonaws.com/pfp/{n}.jpg"])
+        listing = Listings(
+            id=uuid.uuid4(), title=f"Listing {n}", description="Lightly used, pick up on campus. " * 4,
+            price=decimal.Decimal("24.99"), currency="USD", category="furniture", condition="good",
+            status="active", views=n, seller_id=seller.id,
+            images=[f"https://bucket.s3.amazonaws.com/listings/{n}-{i}.jpg" for i in range(3)],
+            created_at=now, updated_at=now,
+            latitude=decimal.Decimal("40.71280000"), longitude=decimal.Decimal("-74.00600000"),
+            display_latitude=decimal.Decimal("40.71712345"), display_longitude=decimal.Decimal("-74.00123456"),
+            location="New York, NY", tags=["desk", "wood"], image_variants_ready=False
+        )
+        rows.append((listing, seller))
+    return rows
+
+
+def median_ms(run) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(args):
+    count = int(args[0]) if args else 1000
+    rows = sample_rows(count)
+    print(f"{count} listings, {len(old_page(rows))} / {len(new_page(rows))} bytes")
+    print(f"  jsonable_encoder  {median_ms(lambda: old_page(rows)):8.2f} ms")
+    print(f"  orjson            {median_ms(lambda: new_page(rows)):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
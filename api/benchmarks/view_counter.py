@@ -0,0 +1,83 @@
+"""
+View counting throughput: the old per-view read-modify-write commit against
+the in-memory ViewCounter with batched flushes.
+
+    python -m benchmarks.view_counter               # ViewCounter only, no database
+    python -m benchmarks.view_counter <listing_id>  # both, against the configured database
+
+With a listing id, VIEWS views are counted on that listing each way and its
+view count is put back afterwards.
+"""
+import sys
+import time
+import uuid
+
+from services.view_counter import ViewCounter
+
+VIEWS = 2000
+# Listings viewed round-robin in the memory-only run
+LISTINGS = 1000
+# Views between flushes in the database run, about one flush interval of a busy listing
+FLUSH_EVERY = 500
+
+
+def views_per_second(count: int, run) -> float:
+    started = time.perf_counter()
+    run()
+    return count / (time.perf_counter() - started)
+
+
+def count_in_memory(counter: ViewCounter, listing_ids, db=None, flush_every: int = 0):
+    for n in range(VIEWS):
+        listing_id = listing_ids[n % len(listing_ids)]
+        counter.lookup(listing_id, db)
+        counter.record(listing_id)
+        if flush_every and (n + 1) % flush_every == 0:
+            counter.flush()
+    if flush_every:
+        counter.flush()
+
+
+def count_with_commits(db, listing_id: uuid.UUID):
+    from models import Listings
+
+    for _ in range(VIEWS):
+        listing = db.query(Listings).filter(Listings.id == listing_id).first()
+        listing.views = (listing.views or 0) + 1
+        db.commit()
+        db.refresh(listing)
+
+
+def main(args):
+    if not args:
+        counter = ViewCounter(max_listings=LISTINGS)
+        listing_ids = [uuid.uuid4() for _ in range(LISTINGS)]
+        # Seen before, so lookups are answered from memory as on a warm server
+        for listing_id in listing_ids:
+            counter._remember(listing_id, uuid.uuid4(), 0)
+        rate = views_per_second(VIEWS, lambda: count_in_memory(counter, listing_ids))
+        print(f"ViewCounter   {rate:12,.0f} views/s over {LISTINGS} listings")
+        return
+
+    from db.database import SessionLocal
+    from models import Listings
+
+    listing_id = uuid.UUID(args[0])
+    db = SessionLocal()
+    original = db.query(Listings.views).filter(Listings.id == listing_id).scalar()
+    try:
+        rate = views_per_second(VIEWS, lambda: count_with_commits(db, listing_id))
+        print(f"commit/view   {rate:12,.0f} views/s")
+
+        counter = ViewCounter()
+        rate = views_per_second(VIEWS, lambda: count_in_memory(counter, [listing_id], db, FLUSH_EVERY))
+        print(f"ViewCounter   {rate:12,.0f} views/s, flushing every {FLUSH_EVERY}")
+    finally:
+        db.rollback()
+        db.query(Listings).filter(Listings.id == listing_id).update({Listings.views: original})
+        db.commit()
+        db.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
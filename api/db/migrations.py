@@ -0,0 +1,277 @@
+"""
+Schema changes and data backfills applied on top of the existing database.
+
+There is no migration framework for this schema, so each migration is a plain
+function that receives an autocommit connection (needed for
+CREATE INDEX CONCURRENTLY and for committing backfills batch by batch).
+Every migration is written to be safe to re-run.
+
+Usage (from the api directory):
+    python -m db.migrations                  # list migrations
+    python -m db.migrations <name> [<name>]  # run the named migrations
+"""
+import sys
+
+from sqlalchemy import text
+
+from db.database import engine
+from services.location_service import display_coords
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def listings_created_at_id_index(conn):
+    """Composite index backing keyset pagination of the listing feeds"""
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_created_at_id "
+        "ON listings (created_at, id)"
+    ))
+
+
+def listings_search_vector(conn):
+    """
+    Weighted tsvector for full-text search (title A, description and tags B),
+    kept current by a trigger, backfilled in batches and indexed with GIN.
+    """
+    conn.execute(text("ALTER TABLE listings ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION listings_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(array_to_string(NEW.tags, ' '), '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text("DROP TRIGGER IF EXISTS listings_search_vector_trigger ON listings"))
+    conn.execute(text("""
+        CREATE TRIGGER listings_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, description, tags ON listings
+        FOR EACH ROW EXECUTE FUNCTION listings_search_vector_update()
+    """))
+
+    # Touching title fires the trigger, which fills in the vector
+    total = 0
+    while True:
+        updated = conn.execute(text("""
+            UPDATE listings SET title = title
+            WHERE id IN (SELECT id FROM listings WHERE search_vector IS NULL LIMIT :batch)
+        """), {"batch": BACKFILL_BATCH_SIZE}).rowcount
+        if not updated:
+            break
+        total += updated
+        print(f"  backfilled {total} listings")
+
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_search_vector "
+        "ON listings USING gin (search_vector)"
+    ))
+
+
+def listings_geography(conn):
+    """
+    PostGIS geography column with a GiST index for radius queries
+    (SPATIAL_BACKEND=postgis). Backfills rows in batches; re-run it after
+    enabling the backend to pick up listings created in between.
+    """
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+    conn.execute(text("ALTER TABLE listings ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)"))
+
+    total = 0
+    while True:
+        updated = conn.execute(text("""
+            UPDATE listings
+            SET geog = ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326)::geography
+            WHERE id IN (
+                SELECT id FROM listings
+                WHERE geog IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+                LIMIT :batch
+            )
+        """), {"batch": BACKFILL_BATCH_SIZE}).rowcount
+        if not updated:
+            break
+        total += updated
+        print(f"  backfilled {total} listings")
+
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_geog "
+        "ON listings USING gist (geog)"
+    ))
+
+
+def listings_display_coords(conn):
+    """
+    Columns holding each listing's fuzzed public location, backfilled in
+    batches with the same id-seeded offset the read path used to compute.
+    """
+    conn.execute(text("ALTER TABLE listings ADD COLUMN IF NOT EXISTS display_latitude numeric(10, 8)"))
+    conn.execute(text("ALTER TABLE listings ADD COLUMN IF NOT EXISTS display_longitude numeric(11, 8)"))
+
+    total = 0
+    while True:
+        rows = conn.execute(text("""
+            SELECT id, latitude, longitude FROM listings
+            WHERE display_latitude IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+            LIMIT :batch
+        """), {"batch": BACKFILL_BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            display_latitude, display_longitude = display_coords(row.id, row.latitude, row.longitude)
+            updates.append({"id": row.id, "lat": display_latitude, "lon": display_longitude})
+
+        conn.execute(text(
+            "UPDATE listings SET display_latitude = :lat, display_longitude = :lon WHERE id = :id"
+        ), updates)
+        total += len(rows)
+        print(f"  backfilled {total} listings")
+
+
+def listings_display_coords_index(conn):
+    """Index on the display coordinates, which map viewports are clustered by"""
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_display_lat_lng "
+        "ON listings (display_latitude, display_longitude)"
+    ))
+
+
+def listings_image_variants_ready(conn):
+    """
+    Flag marking listings whose image variants all exist. Run
+    `python -m services.image_pipeline` afterwards to generate missing
+    variants for existing listings and set it.
+    """
+    conn.execute(text(
+        "ALTER TABLE listings ADD COLUMN IF NOT EXISTS image_variants_ready boolean DEFAULT false"
+    ))
+
+
+def users_email_domain(conn):
+    """
+    Indexed email domain on users for organization feeds, backfilled in
+    batches, plus an index on listings.seller_id so an org feed reads only
+    that org's listings.
+    """
+    conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS email_domain text"))
+
+    # Matches services.org_service.email_domain
+    total = 0
+    while True:
+        updated = conn.execute(text("""
+            UPDATE users SET email_domain = lower(trim(substring(email from '@([^@]*)$')))
+            WHERE id IN (
+                SELECT id FROM users
+                WHERE email_domain IS NULL AND email LIKE '%@%'
+                LIMIT :batch
+            )
+        """), {"batch": BACKFILL_BATCH_SIZE}).rowcount
+        if not updated:
+            break
+        total += updated
+        print(f"  backfilled {total} users")
+
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email_domain "
+        "ON users (email_domain)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_seller_id "
+        "ON listings (seller_id)"
+    ))
+
+
+def s3_deletions(conn):
+    """Durable queue of bucket objects to delete, drained by services.deletion_queue"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS s3_deletions (
+            key text PRIMARY KEY,
+            attempts integer NOT NULL DEFAULT 0,
+            next_attempt_at timestamptz NOT NULL DEFAULT now(),
+            last_error text,
+            dead_at timestamptz,
+            created_at timestamptz DEFAULT now()
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_s3_deletions_due "
+        "ON s3_deletions (next_attempt_at) WHERE dead_at IS NULL"
+    ))
+
+
+def image_blobs(conn):
+    """Reference counts for content-addressed listing images (IMAGE_STORAGE=content_addressed)"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            digest text PRIMARY KEY,
+            key text NOT NULL,
+            refcount integer NOT NULL,
+            created_at timestamptz DEFAULT now()
+        )
+    """))
+
+
+def geocode_cache(conn):
+    """Persistent reverse geocoding cache keyed by rounded coordinates"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            lat_key numeric(8, 3) NOT NULL,
+            lon_key numeric(8, 3) NOT NULL,
+            location text NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (lat_key, lon_key)
+        )
+    """))
+
+
+def image_url_indexes(conn):
+    """GIN indexes on listing and profile picture URL arrays, for checking an upload isn't attached already"""
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_images "
+        "ON listings USING gin (images)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_pfp_url "
+        "ON users USING gin (pfp_url)"
+    ))
+
+
+MIGRATIONS = {
+    "listings_created_at_id_index": listings_created_at_id_index,
+    "listings_search_vector": listings_search_vector,
+    "listings_geography": listings_geography,
+    "listings_display_coords": listings_display_coords,
+    "listings_display_coords_index": listings_display_coords_index,
+    "listings_image_variants_ready": listings_image_variants_ready,
+    "users_email_domain": users_email_domain,
+    "s3_deletions": s3_deletions,
+    "image_blobs": image_blobs,
+    "geocode_cache": geocode_cache,
+    "image_url_indexes": image_url_indexes,
+}
+
+
+def run(names):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in names:
+            print(f"Running migration {name}...")
+            MIGRATIONS[name](conn)
+            print(f"Finished migration {name}")
+
+
+if __name__ == '__main__':
+    requested = sys.argv[1:]
+    unknown = [name for name in requested if name not in MIGRATIONS]
+
+    if not requested or unknown:
+        if unknown:
+            print(f"Unknown migration(s): {', '.join(unknown)}")
+        print("Available migrations:")
+        for name in MIGRATIONS:
+            print(f"  {name}")
+        sys.exit(1 if unknown else 0)
+
+    run(requested)
@@ -1,15 +1,61 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth, listings, messages, account, websocket
+from db.database import SessionLocal, get_db
+from services.search_service import SEARCH_BACKEND
+from services.search_index import get_search_index
+from services.feed_cache import get_feed_cache
+from services.view_counter import get_view_counter
+from services.image_pipeline import get_image_pipeline
+from services.deletion_queue import get_deletion_queue
+from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the in-memory search index before serving traffic
+    if SEARCH_BACKEND == 'memory':
+        db = SessionLocal()
+        try:
+            get_search_index().rebuild(db)
+            print(f"Search index built with {len(get_search_index())} listings")
+        finally:
+            db.close()
+
+    # Pick up listings written through other workers
+    index_rebuilder = None
+    if SEARCH_BACKEND == 'memory':
+        index_rebuilder = asyncio.create_task(get_search_index().run_periodic_rebuild())
+
+    # Write buffered listing views to the database in batches
+    view_flusher = asyncio.create_task(get_view_counter().run_periodic_flush())
+
+    # Delete queued S3 objects in batches
+    deletion_worker = asyncio.create_task(get_deletion_queue().run_periodic())
+
+    yield
+
+    view_flusher.cancel()
+    deletion_worker.cancel()
+    if index_rebuilder is not None:
+        index_rebuilder.cancel()
+    try:
+        await asyncio.to_thread(get_view_counter().flush)
+    except Exception as e:
+        print(f"Error flushing listing views on shutdown: {str(e)}")
+
+    get_image_pipeline().shutdown()
+
 app = FastAPI(
     title="Marketplace API",
     description="A marketplace application API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 origin = os.getenv("FRONTEND_URL")
@@ -29,6 +75,16 @@ app.add_middleware(
 async def health_check():
     return {"status": "healthy", "message": "Marketplace API is running"}
 
+# Feed result cache counters
+@app.get("/health/feed-cache")
+async def feed_cache_stats():
+    return get_feed_cache().stats()
+
+# S3 deletion queue depth, including dead-lettered keys
+@app.get("/health/deletion-queue")
+def deletion_queue_stats(db: Session = Depends(get_db)):
+    return get_deletion_queue().stats(db)
+
 # Root endpoint
 @app.get("/")
 async def root():
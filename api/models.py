@@ -4,12 +4,22 @@ import decimal
 import uuid
 
 from sqlalchemy import ARRAY, Boolean, CheckConstraint, DateTime, ForeignKeyConstraint, Index, Integer, Numeric, PrimaryKeyConstraint, String, Text, UniqueConstraint, Uuid, text
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.types import UserDefinedType
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, query_expression, relationship
 
 class Base(DeclarativeBase):
     pass
 
 
+class Geography(UserDefinedType):
+    """PostGIS geography(Point, 4326); values are built and read in SQL only"""
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "geography(Point, 4326)"
+
+
 class UsZipcodes(Base):
     __tablename__ = 'us_zipcodes'
     __table_args__ = (
@@ -36,13 +46,17 @@ class Users(Base):
         PrimaryKeyConstraint('id', name='users_pkey'),
         UniqueConstraint('email', name='users_email_key'),
         UniqueConstraint('google_id', name='users_google_id_key'),
-        Index('idx_users_google_id', 'google_id')
+        Index('idx_users_email_domain', 'email_domain'),
+        Index('idx_users_google_id', 'google_id'),
+        Index('idx_users_pfp_url', 'pfp_url', postgresql_using='gin')
     )
 
     id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, server_default=text('gen_random_uuid()'))
     fname: Mapped[str] = mapped_column(Text, nullable=False)
     lname: Mapped[str] = mapped_column(Text, nullable=False)
     email: Mapped[str] = mapped_column(Text, nullable=False)
+    # Lowercased part of email after the @, used to group users into organizations
+    email_domain: Mapped[Optional[str]] = mapped_column(Text)
     password: Mapped[Optional[str]] = mapped_column(Text)
     created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
     updated_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
@@ -63,7 +77,13 @@ class Listings(Base):
         CheckConstraint("status::text = ANY (ARRAY['active'::character varying, 'sold'::character varying, 'archived'::character varying]::text[])", name='listings_status_check'),
         ForeignKeyConstraint(['seller_id'], ['users.id'], ondelete='CASCADE', name='fk_seller'),
         PrimaryKeyConstraint('id', name='listings_pkey'),
-        Index('idx_listings_lat_lng', 'latitude', 'longitude')
+        Index('idx_listings_created_at_id', 'created_at', 'id'),
+        Index('idx_listings_display_lat_lng', 'display_latitude', 'display_longitude'),
+        Index('idx_listings_geog', 'geog', postgresql_using='gist'),
+        Index('idx_listings_images', 'images', postgresql_using='gin'),
+        Index('idx_listings_lat_lng', 'latitude', 'longitude'),
+        Index('idx_listings_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('idx_listings_seller_id', 'seller_id')
     )
 
     id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, server_default=text('gen_random_uuid()'))
@@ -82,7 +102,22 @@ class Listings(Base):
     latitude: Mapped[Optional[decimal.Decimal]] = mapped_column(Numeric(10, 8))
     longitude: Mapped[Optional[decimal.Decimal]] = mapped_column(Numeric(11, 8))
     location: Mapped[Optional[str]] = mapped_column(Text)
+    # Privacy-fuzzed coordinates shown to clients, computed once at write time
+    display_latitude: Mapped[Optional[decimal.Decimal]] = mapped_column(Numeric(10, 8))
+    display_longitude: Mapped[Optional[decimal.Decimal]] = mapped_column(Numeric(11, 8))
     tags: Mapped[Optional[list[str]]] = mapped_column(ARRAY(Text()))
+    # Set once services.image_pipeline has generated every image's variants
+    image_variants_ready: Mapped[Optional[bool]] = mapped_column(Boolean, server_default=text('false'))
+    # Maintained by the listings_search_vector_trigger; deferred so feeds never load it
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, deferred=True)
+    # Only present once the listings_geography migration has run (SPATIAL_BACKEND=postgis)
+    geog: Mapped[Optional[bytes]] = mapped_column(Geography, deferred=True)
+    # Query-time values, only populated by queries that ask for them (with_expression)
+    search_rank: Mapped[Optional[float]] = query_expression()
+    dist_away: Mapped[Optional[float]] = query_expression()
+    # Card view projections (services.projection)
+    description_preview: Mapped[Optional[str]] = query_expression()
+    first_image: Mapped[Optional[str]] = query_expression()
 
     seller: Mapped[Optional['Users']] = relationship('Users', back_populates='listings')
 
@@ -112,6 +147,50 @@ class Messages(Base):
     sender: Mapped['Users'] = relationship('Users', foreign_keys=[sender_id], back_populates='messages_')
 
 
+class GeocodeCache(Base):
+    """Reverse geocoded locations by rounded coordinates (services.geocode_cache)"""
+    __tablename__ = 'geocode_cache'
+    __table_args__ = (
+        PrimaryKeyConstraint('lat_key', 'lon_key', name='geocode_cache_pkey'),
+    )
+
+    lat_key: Mapped[decimal.Decimal] = mapped_column(Numeric(8, 3), primary_key=True)
+    lon_key: Mapped[decimal.Decimal] = mapped_column(Numeric(8, 3), primary_key=True)
+    location: Mapped[str] = mapped_column(Text, nullable=False)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime(True), nullable=False, server_default=text('now()'))
+
+
+class ImageBlobs(Base):
+    """Reference counts of content-addressed listing images (services.image_dedup)"""
+    __tablename__ = 'image_blobs'
+    __table_args__ = (
+        PrimaryKeyConstraint('digest', name='image_blobs_pkey'),
+    )
+
+    # SHA-256 of the image, hex encoded
+    digest: Mapped[str] = mapped_column(Text, primary_key=True)
+    key: Mapped[str] = mapped_column(Text, nullable=False)
+    refcount: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(True), server_default=text('now()'))
+
+
+class S3Deletions(Base):
+    """Objects waiting to be deleted from the bucket (services.deletion_queue)"""
+    __tablename__ = 's3_deletions'
+    __table_args__ = (
+        PrimaryKeyConstraint('key', name='s3_deletions_pkey'),
+        Index('idx_s3_deletions_due', 'next_attempt_at', postgresql_where=text('dead_at IS NULL'))
+    )
+
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text('0'))
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(DateTime(True), nullable=False, server_default=text('now()'))
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+    # Set once the key has failed DELETE_MAX_ATTEMPTS times; dead rows are kept for inspection
+    dead_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(True))
+    created_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(True), server_default=text('now()'))
+
+
 class VerificationCodes(Base):
     __tablename__ = 'verification_codes'
     __table_args__ = (
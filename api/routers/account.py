@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from models import Users, Listings, Messages
 from .auth import verify_jwt_token
 from sqlalchemy.orm import Session
 from db.database import get_db
 from pydantic import BaseModel
+from typing import Optional
+from services.search_service import SEARCH_BACKEND
+from services.search_index import get_search_index
+from services.cluster_service import get_cluster_cache
+from services.feed_cache import get_feed_cache
+from services.view_counter import get_view_counter
+from services.org_service import get_org_cache
+from services.deletion_queue import claimed_uploads, enqueue_image_deletions
+from services.responses import FastJSONResponse, ProfileOut
 
 
 router = APIRouter(
@@ -15,6 +24,9 @@ class UpdateProfile(BaseModel):
     firstName: str
     lastName: str
 
+class UploadPfpIntent(BaseModel):
+    extension: str
+
 
 @router.delete('/delete-account')
 def delete_account(token_data: dict = Depends(verify_jwt_token), db: Session = Depends(get_db)):
@@ -24,7 +36,7 @@ def delete_account(token_data: dict = Depends(verify_jwt_token), db: Session = D
     # Import S3 service here to avoid circular imports
     s3_service = None
     try:
-        from services.s3_service import get_s3_service
+        from services.s3_service import get_s3_service, S3Service
         s3_service = get_s3_service()
         s3_available = True
     except ImportError:
@@ -40,11 +52,16 @@ def delete_account(token_data: dict = Depends(verify_jwt_token), db: Session = D
             detail = "User not found"
         )
 
+    user_listings = db.query(Listings).filter(Listings.seller_id == user_id).all()
+    listing_locations = [
+        (listing.id, listing.category, listing.condition, listing.latitude, listing.longitude,
+         listing.display_latitude, listing.display_longitude)
+        for listing in user_listings
+    ]
+
     # Get all listing images to delete from S3
     all_image_urls = []
     if s3_available:
-        user_listings = db.query(Listings).filter(Listings.seller_id == user_id).all()
-
         for listing in user_listings:
             if listing.images and isinstance(listing.images, list):
                 all_image_urls.extend(listing.images)
@@ -58,16 +75,24 @@ def delete_account(token_data: dict = Depends(verify_jwt_token), db: Session = D
 
     # Delete the user account
     db.delete(user)
+
+    # Queue listing images and the profile picture for deletion in the same transaction
+    if s3_available:
+        enqueue_image_deletions(db, all_image_urls + list(user.pfp_url or []))
     db.commit()
 
-    # Delete images from S3 after database transaction is complete
-    if s3_available and all_image_urls:
-        try:
-            for image_url in all_image_urls:
-                s3_service.delete_image(image_url)
-            print(f"Deleted {len(all_image_urls)} images from S3 for deleted account")
-        except Exception as e:
-            print(f"Warning: Failed to delete some S3 images for deleted account: {str(e)}")
+    search_index = get_search_index()
+    cluster_cache = get_cluster_cache()
+    feed_cache = get_feed_cache()
+    view_counter = get_view_counter()
+    for (listing_id, category, condition, latitude, longitude,
+         display_latitude, display_longitude) in listing_locations:
+        if SEARCH_BACKEND == 'memory':
+            search_index.remove(listing_id)
+        cluster_cache.remove(listing_id, display_latitude, display_longitude)
+        feed_cache.invalidate(category, condition, latitude, longitude)
+        view_counter.forget(listing_id)
+    get_org_cache().forget(user_id)
 
     return {"message": "Account successfully deleted"}
 
@@ -85,9 +110,9 @@ def get_profile(token_data: dict = Depends(verify_jwt_token), db: Session = Depe
             detail = "User not found"
         )
 
-    return {
-        "user": user
-    }
+    return FastJSONResponse({
+        "user": ProfileOut.from_user(user)
+    })
 
 
 @router.put('/profile')
@@ -109,20 +134,42 @@ def update_profile(profile_data: UpdateProfile, token_data: dict = Depends(verif
     user.lname = profile_data.lastName.strip()
     db.commit()
 
-    return {
+    return FastJSONResponse({
         "message": "Profile updated successfully",
-        "user": user
-    }
+        "user": ProfileOut.from_user(user)
+    })
+
+@router.post('/upload_pfp_intent')
+def upload_pfp_intent(intent: UploadPfpIntent, token_data: dict = Depends(verify_jwt_token)):
+    """Presigned POST for uploading a profile picture straight to S3; send its key to PUT /upload_pfp"""
+    from services.s3_service import get_s3_service, S3Service, ALLOWED_IMAGE_EXTENSIONS
+
+    extension = intent.extension.lower().lstrip('.')
+    if extension not in ALLOWED_IMAGE_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
+        )
+
+    key_prefix = S3Service.profile_picture_prefix(token_data['uuid'])
+    return get_s3_service().create_upload_intent(key_prefix, extension)
 
 @router.put('/upload_pfp')
 async def upload_pfp(
-    image: UploadFile = File(...),
+    image: Optional[UploadFile] = File(None),
+    image_key: Optional[str] = Form(None),
     token_data: dict = Depends(verify_jwt_token),
     db: Session = Depends(get_db)
 ):
-    """Upload and update user profile picture"""
+    """Upload and update user profile picture, or use one uploaded through /upload_pfp_intent"""
     user_id = token_data['uuid']
 
+    if image is None and not image_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send an image or the image_key of an upload"
+        )
+
     # Find the user
     user = db.query(Users).filter(Users.id == user_id).first()
     if not user:
@@ -132,25 +179,27 @@ async def upload_pfp(
         )
     
     try:
-        from services.s3_service import get_s3_service
+        from services.s3_service import get_s3_service, S3Service
         s3_service = get_s3_service()
 
-        # Delete old profile picture if it exists
+        old_image_url = None
         if user.pfp_url and isinstance(user.pfp_url, list) and len(user.pfp_url) > 0:
             old_image_url = user.pfp_url[0]
-            try:
-                s3_service.delete_image(old_image_url)
-                print(f"Deleted old profile picture: {old_image_url}")
-            except Exception as e:
-                print(f"Warning: Failed to delete old profile picture: {str(e)}")
-        
-        # Upload new profile picture
-        file_content = await image.read()
-        file_extension = image.filename.split('.')[-1].lower()
-        image_url = s3_service.upload_profile_picture(file_content, file_extension, user_id)
+
+        if image_key:
+            # Already uploaded by the client; check it with a HEAD request
+            image_url = await s3_service.verify_upload_async(image_key, S3Service.profile_picture_prefix(user_id))
+            if claimed_uploads(db, [image_url]):
+                raise ValueError("An upload can only be attached once")
+        else:
+            # Stream the new profile picture to S3 off the event loop; the
+            # type is checked from its leading bytes and the size while streaming
+            image_url = await s3_service.upload_profile_picture_async(image.file, user_id)
         
-        # Update user's profile picture URL in database
+        # Update user's profile picture URL in database, queueing the old one for deletion
         user.pfp_url = [image_url]  # Store as array to match the model
+        if old_image_url and old_image_url != image_url:
+            enqueue_image_deletions(db, [old_image_url])
         db.commit()
         
         return {
@@ -163,6 +212,11 @@ async def upload_pfp(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="S3 service not available"
         )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         print(f"Error uploading profile picture: {str(e)}")
         raise HTTPException(
@@ -16,6 +16,7 @@ load_dotenv()
 from db.database import get_db
 from models import Users, VerificationCodes
 from services.email_service import get_email_service
+from services.org_service import email_domain
 from sqlalchemy.orm import Session
 
 router = APIRouter(
@@ -218,6 +219,7 @@ def register(register: Register, db: Session = Depends(get_db)):
             fname=register.fname,
             lname=register.lname,
             email=register.email,
+            email_domain=email_domain(register.email),
             password=hashed_password
         )
         
@@ -412,6 +414,9 @@ def google_signin(google_auth: GoogleAuth, response: Response, db: Session = Dep
             if not existing_user.google_id:
                 existing_user.google_id = google_sub
                 existing_user.email_verified = True
+            if not existing_user.email_domain:
+                existing_user.email_domain = email_domain(existing_user.email)
+            if db.dirty:
                 db.commit()
 
             return _create_and_set_cookie(response, existing_user)
@@ -422,6 +427,7 @@ def google_signin(google_auth: GoogleAuth, response: Response, db: Session = Dep
                 fname=first_name or 'Google',
                 lname=last_name or 'User',
                 email=google_email,
+                email_domain=email_domain(google_email),
                 google_id=google_sub,
                 email_verified=True,  # Google accounts are pre-verified
                 pfp_url=[picture]
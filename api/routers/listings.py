@@ -1,22 +1,57 @@
 from pydantic import BaseModel
-from fastapi import APIRouter, Depends, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from db.database import get_db
 from models import Users, Listings
-from sqlalchemy.orm import Session, Query
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, Query, contains_eager, with_expression
+from sqlalchemy import REAL, Text, cast, func, literal, or_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from .auth import verify_jwt_token
 from fastapi import HTTPException, status
-from services.s3_service import get_s3_service
-from services.location_service import (get_location_from_coords,
+from services.s3_service import (get_s3_service, S3Service, ALLOWED_IMAGE_EXTENSIONS, MAX_IMAGE_SIZE)
+from services.image_pipeline import get_image_pipeline
+from services.deletion_queue import claimed_uploads, enqueue_image_deletions
+from services.image_dedup import IMAGE_STORAGE, acquire_images
+from services.geocode_cache import get_location_cache
+from services.location_service import (UNKNOWN_LOCATION,
                                            search_location, search_location_suggestions,
-                                           get_bounding_box_corners, generate_coord_offset)
+                                           get_bounding_box_corners, display_coords,
+                                           haversine_miles, geography_point,
+                                           SPATIAL_BACKEND, METERS_PER_MILE, DISPLAY_OFFSET_MAX_MILES)
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, clamp_page_size, keyset_page
+from services.search_service import SEARCH_BACKEND, full_text_search, memory_search_page
+from services.search_index import get_search_index
+from services.feed_cache import FeedScope, get_feed_cache
+from services.view_counter import get_view_counter
+from services.org_service import get_org_cache
+from services.responses import (FastJSONResponse, ClusterListingOut, ListingItem, ListingOut,
+                                SellerOut, encode_json)
+from services.projection import ListingProjection, parse_projection
+from services.facet_service import compute_facets, empty_facets, filter_by_search
+from services.http_cache import (LISTING_CACHE_CONTROL, USER_LISTINGS_CACHE_CONTROL, LOCATION_CACHE_CONTROL,
+                                 conditional_json, etag_matches, make_etag, not_modified)
+from services.cluster_service import (MAX_ZOOM, CACHE_MAX_ZOOM, aggregate_cells, cell_size,
+                                      fit_zoom, get_cluster_cache)
 from typing import List, Optional
+import asyncio
+import datetime
 import uuid
 router = APIRouter(
     prefix="/listings",
     tags=["listings"]
 )
 
+SORT_OPTIONS = ('newest', 'distance')
+
+# Rows fetched per round trip from the server-side cursor in streaming mode
+STREAM_BATCH_SIZE = 500
+
+# Most ids accepted by POST /listings/batch
+BATCH_MAX_IDS = MAX_PAGE_SIZE
+
+# Most presigned uploads handed out per request
+MAX_UPLOAD_INTENTS = 10
+
 
 class Listing(BaseModel):
     title: str
@@ -27,15 +62,9 @@ class Listing(BaseModel):
     longitude: Optional[float] = None
     condition: str
 
-class User(BaseModel):
-    id: uuid.UUID
-    fname: str
-    lname: str
-    email: str
-    pfp_url: Optional[list[str]] = None
-
 @router.post("")
 async def create_listing(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
@@ -44,50 +73,77 @@ async def create_listing(
     longitude: float = Form(...),
     condition: str = Form(...),
     images: Optional[List[UploadFile]] = File(None),
+    image_keys: Optional[List[str]] = Form(None),
     token_data: dict = Depends(verify_jwt_token),
     db: Session = Depends(get_db)
 ):
     seller_id = token_data['uuid']
     s3_id = str(uuid.uuid4())
     image_urls = []
+    # Objects this request put in the bucket, deleted again if it fails
+    written_urls = []
     
     try:
         # Handle image uploads
         if images and len(images) > 0 and images[0].filename:
-            # Validate image files
-            allowed_extensions = {'jpg', 'jpeg', 'png', 'webp'}
-            max_file_size = 5 * 1024 * 1024  # 5MB
-            
-            image_urls = []
-            
             for image in images:
-                # Check file size
-                if hasattr(image, 'size') and image.size > max_file_size:
+                # Reject early when the part's size is already known; the
+                # limit is enforced again while streaming
+                if image.size is not None and image.size > MAX_IMAGE_SIZE:
                     raise HTTPException(
                         status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail=f"Image {image.filename} is too large. Maximum size is 5MB."
-                    )
-                
-                # Check file extension
-                file_extension = image.filename.split('.')[-1].lower()
-                if file_extension not in allowed_extensions:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+                        detail=f"Image {image.filename} is too large. Maximum size is {MAX_IMAGE_SIZE // (1024 * 1024)}MB."
                     )
-                
-                # Read file content
-                file_content = await image.read()
-                
-                # Upload to S3
-                image_url = get_s3_service().upload_listing_image(file_content, file_extension, s3_id)
-                image_urls.append(image_url)
+
+            # Stream the spooled files to S3 concurrently, off the event loop;
+            # the file type comes from each file's leading bytes
+            files = [image.file for image in images]
+            try:
+                if IMAGE_STORAGE == 'content_addressed':
+                    # Content already in the bucket only gains a reference, committed with the listing
+                    image_urls, uploads = await acquire_images(db, files)
+                    written_urls = [get_s3_service().public_url(key) for _, key, _ in uploads]
+                    await get_s3_service().upload_image_streams(uploads)
+                else:
+                    image_urls = await get_s3_service().upload_listing_images(files, s3_id)
+                    written_urls = list(image_urls)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+
+        # Images the client already uploaded through POST /listings/upload-intents
+        if image_keys:
+            try:
+                if len(set(image_keys)) != len(image_keys):
+                    raise ValueError("An upload can only be attached once")
+                uploaded_urls = await get_s3_service().verify_uploads(
+                    image_keys, S3Service.listing_upload_prefix(seller_id)
+                )
+                # Checked before the URLs join written_urls, so a failure never queues someone else's image
+                if claimed_uploads(db, uploaded_urls):
+                    raise ValueError("An upload can only be attached once")
+                image_urls = image_urls + uploaded_urls
+                written_urls = written_urls + uploaded_urls
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
         
 
-        location = get_location_from_coords(latitude, longitude)
+        # On a cache miss the listing is saved as Unknown and its location filled in after the response
+        cached_location = get_location_cache().lookup(db, latitude, longitude)
+        location = cached_location or UNKNOWN_LOCATION
         
         # Create listing using SQLAlchemy
+        # The id seeds the display offset, so assign it here rather than in the database
+        listing_id = uuid.uuid4()
+        display_latitude, display_longitude = display_coords(listing_id, latitude, longitude)
+
         new_listing = Listings(
+            id=listing_id,
             title=title,
             description=description,
             price=price,
@@ -95,6 +151,8 @@ async def create_listing(
             category=category,
             latitude=latitude,
             longitude=longitude,
+            display_latitude=display_latitude,
+            display_longitude=display_longitude,
             condition=condition,
             status='active',
             views=0,
@@ -102,10 +160,29 @@ async def create_listing(
             images=image_urls,
             location=location
         )
+
+        if SPATIAL_BACKEND == 'postgis':
+            new_listing.geog = geography_point(latitude, longitude)
         
         db.add(new_listing)
-        db.commit()
+        # Committing releases the image references' row locks, which other
+        # requests for the same content may be waiting on in worker threads
+        await asyncio.to_thread(db.commit)
         db.refresh(new_listing)
+
+        if SEARCH_BACKEND == 'memory':
+            get_search_index().add_listing(new_listing)
+        get_cluster_cache().add(new_listing.id, new_listing.display_latitude, new_listing.display_longitude)
+        get_feed_cache().invalidate(category, condition, latitude, longitude)
+
+        # Thumbnails and WebP variants are generated after the response goes out;
+        # the listing links them once they all exist
+        if image_urls:
+            background_tasks.add_task(get_image_pipeline().process_listing,
+                                      new_listing.id, image_urls, set(written_urls))
+        if cached_location is None:
+            background_tasks.add_task(get_location_cache().fill_listing,
+                                      new_listing.id, latitude, longitude, category, condition)
         
         response_data = {
             "message": "Listing created successfully",
@@ -113,17 +190,22 @@ async def create_listing(
         }
         
         # Add images to response if they were uploaded
-        if images and len(images) > 0 and images[0].filename:
+        if image_urls:
             response_data["images"] = image_urls
         
         return response_data
         
     except Exception as e:
-        # Clean up any uploaded images if database insert fails
-        if 'image_urls' in locals() and images and len(images) > 0:
-            if image_urls:
-                for image in image_urls:
-                    get_s3_service().delete_image(image)
+        # Rolling back drops the image references this request took, and
+        # their row locks, whether or not it uploaded anything
+        db.rollback()
+        # Queue any uploaded images for deletion if the database insert fails
+        if written_urls:
+            try:
+                enqueue_image_deletions(db, written_urls, release_references=False)
+                db.commit()
+            except Exception as cleanup_error:
+                print(f"Warning: Failed to queue uploaded images for deletion: {str(cleanup_error)}")
         
         if isinstance(e, HTTPException):
             raise e
@@ -132,6 +214,32 @@ async def create_listing(
             detail=f"Failed to create listing: {str(e)}"
         )
 
+class UploadIntentRequest(BaseModel):
+    extensions: List[str]
+
+@router.post("/upload-intents")
+def create_listing_upload_intents(request: UploadIntentRequest, token_data: dict = Depends(verify_jwt_token)):
+    """
+    Presigned POSTs for uploading listing images straight to S3, one per
+    extension. Post each file to its url with its fields, then send the keys
+    to POST /listings as image_keys.
+    """
+    extensions = [extension.lower().lstrip('.') for extension in request.extensions]
+    if not extensions or len(extensions) > MAX_UPLOAD_INTENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Request between 1 and {MAX_UPLOAD_INTENTS} uploads"
+        )
+    if any(extension not in ALLOWED_IMAGE_EXTENSIONS for extension in extensions):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
+        )
+
+    s3_service = get_s3_service()
+    key_prefix = S3Service.listing_upload_prefix(token_data['uuid'])
+    return {"uploads": [s3_service.create_upload_intent(key_prefix, extension) for extension in extensions]}
+
 @router.get("")
 def get_listings(user_id: Optional[str] = None,
                  db: Session = Depends(get_db),
@@ -140,26 +248,30 @@ def get_listings(user_id: Optional[str] = None,
                  dist: Optional[float] = None,
                  org_filter: Optional[bool] = False,
                  category: Optional[str] = None,
-                 condition: Optional[str] = None
+                 condition: Optional[str] = None,
+                 limit: int = DEFAULT_PAGE_SIZE,
+                 cursor: Optional[str] = None,
+                 sort: Optional[str] = 'newest',
+                 stream: bool = False,
+                 view: Optional[str] = None,
+                 fields: Optional[str] = None
                  ):
-    # Query listings with seller information using SQLAlchemy relationships
-    query = (
-        db.query(Listings)
-        .join(Users, Listings.seller_id == Users.id)
-        .order_by(Listings.created_at.desc())
-    )
+    validate_sort(sort, lat, lon, dist)
+    projection = parse_projection(view, fields)
 
-    query = apply_filters(user_id, query, lat, lon, dist, org_filter, db, category, condition)
-
-    listings = query.all()
-
-    # Format response with seller information
-    result = []
-    for listing in listings:
-        seller = db.query(Users).filter(Users.id == listing.seller_id).first()
-        result.append(format_listing(listing, seller, dist))
+    if stream:
+        # Every matching listing as NDJSON; limit and cursor don't apply
+        query = apply_filters(user_id, feed_query(db), lat, lon, dist, org_filter, db, category, condition)
+        if sort == 'distance':
+            query = query.order_by(distance_miles_from(lat, lon), Listings.id)
+        else:
+            query = query.order_by(Listings.created_at.desc(), Listings.id.desc())
+        return stream_listings(query, projection=projection)
 
-    return result
+    return FastJSONResponse(cached_feed_page(
+        load_feed_page, db, user_id, lat, lon, dist, org_filter, category, condition,
+        limit=clamp_page_size(limit), cursor=cursor, sort=sort, projection=projection
+    ))
 
 
 @router.get("/search")
@@ -169,51 +281,340 @@ def search_listing(q: str, user_id: Optional[str] = None, db: Session = Depends(
                  dist: Optional[float] = None,
                    org_filter: Optional[bool] = False,
                    category: Optional[str] = None,
-                   condition: Optional[str] = None):
-    query = (
+                   condition: Optional[str] = None,
+                   limit: int = DEFAULT_PAGE_SIZE,
+                   cursor: Optional[str] = None,
+                   sort: Optional[str] = None,
+                   view: Optional[str] = None,
+                   fields: Optional[str] = None):
+    # Without an explicit sort, search results come back by relevance
+    # (or newest first for the ilike backend). The memory backend only ranks
+    # by relevance, so an explicit sort falls back to matching in SQL.
+    validate_sort(sort, lat, lon, dist)
+    projection = parse_projection(view, fields)
+
+    return FastJSONResponse(cached_feed_page(
+        load_search_page, db, user_id, lat, lon, dist, org_filter, category, condition,
+        limit=clamp_page_size(limit), cursor=cursor, sort=sort, q=q.strip(), projection=projection
+    ))
+
+
+SELLER_COLUMNS = (Users.id, Users.fname, Users.lname, Users.email, Users.pfp_url)
+
+def feed_query(db: Session):
+    # Query listings with seller information using SQLAlchemy relationships.
+    # The seller row comes back in the same statement via contains_eager, limited
+    # to the columns a seller card shows so password hashes etc. are never selected.
+    return (
         db.query(Listings)
         .join(Users, Listings.seller_id == Users.id)
-        .order_by(Listings.created_at.desc())
+        .options(contains_eager(Listings.seller).load_only(*SELLER_COLUMNS))
     )
 
-    query = apply_filters(user_id, query, lat, lon, dist, org_filter, db, category, condition)
 
-    if q:
-        query = query.filter(
-            or_(
-                Listings.title.ilike(f"%{q}%"),
-                Listings.description.ilike(f"%{q}%")
+def load_feed_page(query: Query[Listing], lat, lon, limit: int, cursor: Optional[str], sort: Optional[str],
+                   projection: Optional[ListingProjection] = None):
+    if projection:
+        query = query.options(*projection.load_options())
+
+    if sort == 'distance':
+        listings, next_cursor = paginate_nearest_first(query, lat, lon, limit, cursor)
+    else:
+        listings, next_cursor = paginate_newest_first(query, limit, cursor)
+
+    return format_page(listings, next_cursor, projection)
+
+
+def load_search_page(query: Query[Listing], lat, lon, limit: int, cursor: Optional[str],
+                     sort: Optional[str], q: str, projection: Optional[ListingProjection] = None):
+    if projection:
+        query = query.options(*projection.load_options())
+
+    if q and SEARCH_BACKEND == 'memory' and not sort:
+        listings, next_cursor = memory_search_page(query, q, limit, cursor)
+    elif q and SEARCH_BACKEND == 'fts':
+        ranked_query, rank = full_text_search(query, q)
+        if ranked_query is None:
+            return {"listings": [], "next_cursor": None}
+        if sort == 'distance':
+            listings, next_cursor = paginate_nearest_first(ranked_query, lat, lon, limit, cursor)
+        elif sort == 'newest':
+            listings, next_cursor = paginate_newest_first(ranked_query, limit, cursor)
+        else:
+            listings, next_cursor = paginate_by_rank(ranked_query, rank, limit, cursor)
+    else:
+        if q:
+            query = query.filter(
+                or_(
+                    Listings.title.ilike(f"%{q}%"),
+                    Listings.description.ilike(f"%{q}%")
+                )
             )
-        )
 
-    listings = query.all()
+        if sort == 'distance':
+            listings, next_cursor = paginate_nearest_first(query, lat, lon, limit, cursor)
+        else:
+            listings, next_cursor = paginate_newest_first(query, limit, cursor)
 
-    result = []
-    for listing in listings:
-        seller = db.query(Users).filter(Users.id == listing.seller_id).first()
-        result.append(format_listing(listing, seller))
+    return format_page(listings, next_cursor, projection)
+
+
+def format_page(listings: List[Listings], next_cursor: Optional[str], projection: Optional[ListingProjection]):
+    """A feed page with seller information"""
+    return {
+        "listings": [format_listing(listing, listing.seller, projection) for listing in listings],
+        "next_cursor": next_cursor,
+    }
+
+
+def cached_feed_page(load_page, db: Session, user_id, lat, lon, dist, org_filter, category, condition,
+                     **page_args):
+    """
+    Serve a feed or search page from the feed cache, loading it with
+    load_page(query, lat, lon, **page_args) on a miss.
+
+    Entries are keyed by every parameter that changes which listings make the
+    page: the asker (whose own listings are left out), their org when
+    filtering by it, and the exact center and radius. Pages are cached as
+    loaded and never filtered afterwards, so a full page stays full and its
+    cursor continues right after its last listing.
+    """
+    cache = get_feed_cache()
+    if not cache.enabled:
+        query = apply_filters(user_id, feed_query(db), lat, lon, dist, org_filter, db, category, condition)
+        return load_page(query, lat, lon, **page_args)
+
+    org = get_user_org(db, user_id) if org_filter else None
+    key = (load_page.__name__, user_id.lower() if user_id else None, org, lat, lon, dist,
+           category.lower() if category else None, condition, tuple(sorted(page_args.items())))
+
+    page = cache.get(key)
+    if page is None:
+        query = apply_filters(user_id, feed_query(db), lat, lon, dist, org_filter, db, category, condition)
+        page = load_page(query, lat, lon, **page_args)
+        cache.put(key, page, FeedScope.for_filters(category, condition, lat, lon, dist))
+    return page
+
+def stream_listings(query: Query[Listing], seller: Optional[Users] = None,
+                    projection: Optional[ListingProjection] = None):
+    """
+    Respond with every listing in `query` as NDJSON, one formatted listing per
+    line. Rows come from a server-side cursor STREAM_BATCH_SIZE at a time and
+    are written as they are formatted, so memory stays flat however many
+    listings match and the first bytes go out after the first batch.
+    """
+    if projection:
+        query = query.options(*projection.load_options(with_seller=seller is None))
 
-    return result
+    def lines():
+        for listing in query.yield_per(STREAM_BATCH_SIZE):
+            yield encode_json(format_listing(listing, seller or listing.seller, projection)) + b'\n'
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @router.get("/user_listings/{user_id}")
-def get_user_listings(user_id: str, db: Session = Depends(get_db)):
-    # Query user's listings
-    listings = db.query(Listings).filter(Listings.seller_id == user_id).all()
+def get_user_listings(user_id: str, request: Request, db: Session = Depends(get_db), stream: bool = False,
+                      view: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_projection(view, fields)
 
     # Get seller information (self)
     seller = db.query(Users).filter(Users.id == user_id).first()
+
+    if stream:
+        query = (
+            db.query(Listings)
+            .filter(Listings.seller_id == user_id)
+            .order_by(Listings.created_at.desc(), Listings.id.desc())
+        )
+        return stream_listings(query, seller, projection)
+
+    # Version the listings from their ids, update times and view counts only,
+    # so an unchanged list is answered with a 304 before any listing is loaded
+    listings_version = (
+        db.query(
+            func.count(Listings.id),
+            func.md5(func.string_agg(
+                cast(Listings.id, Text) + literal(':') + func.coalesce(cast(Listings.updated_at, Text), '')
+                + literal(':') + cast(func.coalesce(Listings.views, 0), Text),
+                aggregate_order_by(literal(','), Listings.id)
+            ))
+        )
+        .filter(Listings.seller_id == user_id)
+        .one()
+    )
+    seller_version = (seller.fname, seller.lname, seller.email, seller.pfp_url) if seller else None
+    etag = make_etag('user_listings', user_id.lower(), view, fields, *listings_version, seller_version)
+    if etag_matches(request, etag):
+        return not_modified(etag, USER_LISTINGS_CACHE_CONTROL)
+
+    # Query user's listings
+    query = db.query(Listings).filter(Listings.seller_id == user_id)
+    if projection:
+        query = query.options(*projection.load_options(with_seller=False))
+    listings = query.all()
     
     # Convert to dict format for response
     result = []
     for listing in listings:
-        result.append(format_listing(listing, seller))
+        result.append(format_listing(listing, seller, projection))
+
+    return conditional_json(request, result, USER_LISTINGS_CACHE_CONTROL, etag=etag)
+
+@router.get("/clusters")
+def get_listing_clusters(south: float, west: float, north: float, east: float, zoom: int,
+                         user_id: Optional[str] = None,
+                         db: Session = Depends(get_db),
+                         lat: Optional[float] = None,
+                         lon: Optional[float] = None,
+                         dist: Optional[float] = None,
+                         org_filter: Optional[bool] = False,
+                         category: Optional[str] = None,
+                         condition: Optional[str] = None):
+    """
+    Aggregate the listings in a map viewport into grid cells sized for the
+    zoom level (no deeper than CLUSTER_MAX_ZOOM). Each cluster has a count,
+    the centroid of its listings' display locations and the newest listing
+    in the cell. Accepts the same filters as GET /listings.
+    """
+    if south >= north or west >= east or not 0 <= zoom <= MAX_ZOOM:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected south < north, west < east and 0 <= zoom <= {MAX_ZOOM}"
+        )
 
-    return result
+    zoom = fit_zoom(zoom, south, west, north, east)
+    # The asker's own listings are left out of cached cells afterwards rather than filtered in SQL
+    filtered = any([org_filter, category, condition, lat and lon and dist])
+
+    if not filtered and zoom <= CACHE_MAX_ZOOM:
+        cells = get_cluster_cache().cells(db, zoom, south, west, north, east, exclude_seller=user_id)
+    else:
+        query = db.query(Listings).join(Users, Listings.seller_id == Users.id)
+        query = apply_filters(user_id, query, lat, lon, dist, org_filter, db, category, condition)
+        cells = aggregate_cells(query, zoom, south, west, north, east)
+
+    representative_ids = [cell.representative_id for cell in cells.values() if cell.representative_id]
+    representatives = {
+        listing.id: listing
+        for listing in db.query(Listings).filter(Listings.id.in_(representative_ids))
+    } if representative_ids else {}
+
+    clusters = []
+    for key, cell in cells.items():
+        cluster = cell.as_cluster(key)
+        representative = representatives.get(cluster.pop("representative_id"))
+        cluster["listing"] = format_cluster_listing(representative) if representative is not None else None
+        clusters.append(cluster)
+
+    return FastJSONResponse({"zoom": zoom, "cell_size": cell_size(zoom), "clusters": clusters})
+
+@router.get("/facets")
+def get_listing_facets(user_id: Optional[str] = None,
+                       db: Session = Depends(get_db),
+                       lat: Optional[float] = None,
+                       lon: Optional[float] = None,
+                       dist: Optional[float] = None,
+                       org_filter: Optional[bool] = False,
+                       category: Optional[str] = None,
+                       condition: Optional[str] = None,
+                       q: Optional[str] = None):
+    """
+    Category counts, condition counts and a price histogram for the listings
+    GET /listings (or /listings/search when q is given) returns for the same
+    filters. Cached in the feed cache and shared between users, so the counts
+    include the asker's own listings.
+    """
+    q = q.strip() if q else None
+    cache = get_feed_cache()
+
+    key = None
+    if cache.enabled:
+        # Like feed pages, radius queries are keyed by their exact center and radius
+        org = get_user_org(db, user_id) if org_filter else None
+        key = ('facets', org, lat, lon, dist, category.lower() if category else None, condition,
+               q.lower() if q else None)
+        facets = cache.get(key)
+        if facets is not None:
+            return FastJSONResponse(facets)
+
+    query = db.query(Listings).join(Users, Listings.seller_id == Users.id)
+    query = apply_filters(user_id, query, lat, lon, dist, org_filter, db, category, condition,
+                          exclude_own=False)
+    query = filter_by_search(query, q)
+    facets = compute_facets(query) if query is not None else empty_facets()
+
+    if key is not None:
+        cache.put(key, facets, FeedScope.for_filters(category, condition, lat, lon, dist))
+    return FastJSONResponse(facets)
+
+class BatchListingsRequest(BaseModel):
+    ids: List[str]
+    view: Optional[str] = None
+    fields: Optional[str] = None
+
+@router.post("/batch")
+def get_listings_batch(request: BatchListingsRequest, db: Session = Depends(get_db)):
+    """
+    Look up several listings and their sellers in one query. Returns the
+    listings keyed by id exactly as sent; ids that are malformed or don't
+    exist are listed under "missing" instead of failing the call.
+    """
+    # Checked before any parsing, so an oversized request costs nothing more
+    if len(request.ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BATCH_MAX_IDS} ids can be requested at once"
+        )
+    requested = list(dict.fromkeys(request.ids))
+    projection = parse_projection(request.view, request.fields)
+
+    # Parsed id -> every spelling of it the client sent, which key the response
+    listing_ids = {}
+    for listing_id in requested:
+        try:
+            listing_ids.setdefault(uuid.UUID(listing_id.strip()), []).append(listing_id)
+        except ValueError:
+            pass
+
+    found = {}
+    if listing_ids:
+        query = feed_query(db).filter(Listings.id.in_(list(listing_ids)))
+        if projection:
+            query = query.options(*projection.load_options())
+        for listing in query:
+            item = format_listing(listing, listing.seller, projection)
+            for listing_id in listing_ids[listing.id]:
+                found[listing_id] = item
+
+    return FastJSONResponse({
+        "listings": found,
+        "missing": [listing_id for listing_id in requested if listing_id not in found]
+    })
 
 @router.get("/{listing_id}")
-def get_listing(listing_id: str, db: Session = Depends(get_db)):
+def get_listing(listing_id: str, request: Request, db: Session = Depends(get_db)):
+    listing_uuid = uuid.UUID(listing_id)
+
+    # Check the client's copy against the columns that can change before loading the whole listing
+    version = (
+        db.query(Listings.updated_at, Listings.views, Users.fname, Users.lname, Users.email, Users.pfp_url)
+        .join(Users, Listings.seller_id == Users.id)
+        .filter(Listings.id == listing_uuid)
+        .first()
+    )
+
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Listing not found"
+        )
+
+    etag = make_etag('listing', listing_uuid, *version)
+    if etag_matches(request, etag):
+        return not_modified(etag, LISTING_CACHE_CONTROL)
+
     # Find the listing
-    listing = db.query(Listings).filter(Listings.id == uuid.UUID(listing_id)).first()
+    listing = db.query(Listings).filter(Listings.id == listing_uuid).first()
 
     if not listing:
         raise HTTPException(
@@ -227,7 +628,7 @@ def get_listing(listing_id: str, db: Session = Depends(get_db)):
     # Format response
     result = format_listing(listing, seller)
 
-    return result
+    return conditional_json(request, result, LISTING_CACHE_CONTROL, etag=etag)
 
 class IncrementViewRequest(BaseModel):
     user_id: Optional[str] = None
@@ -239,27 +640,26 @@ def increment_listing_view(listing_id: str, request: IncrementViewRequest, db: S
     This is a public endpoint that doesn't require authentication.
     If user_id is provided and matches the seller_id, the view won't be counted.
     """
-    # Find the listing
-    listing = db.query(Listings).filter(Listings.id == uuid.UUID(listing_id)).first()
+    counter = get_view_counter()
+    listing_uuid = uuid.UUID(listing_id)
 
-    if not listing:
+    # Seller and current count come from memory once the listing has been seen
+    known = counter.lookup(listing_uuid, db)
+
+    if known is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Listing not found"
         )
 
-    # Don't increment if the viewer is the seller
-    if request.user_id and str(listing.seller_id) == request.user_id:
-        return {"views": listing.views, "incremented": False}
-
-    # Increment views
-    listing.views = (listing.views or 0) + 1
+    seller_id, views = known
 
-    # Save to database
-    db.commit()
-    db.refresh(listing)
+    # Don't increment if the viewer is the seller
+    if request.user_id and str(seller_id) == request.user_id:
+        return {"views": views, "incremented": False}
 
-    return {"views": listing.views, "incremented": True}
+    # Counted in memory and written to the database in the next batched flush
+    return {"views": counter.record(listing_uuid), "incremented": True}
 
 @router.delete("/{listing_id}")
 def delete_listing(listing_id: str, token_data: dict = Depends(verify_jwt_token), db: Session = Depends(get_db)):
@@ -281,22 +681,28 @@ def delete_listing(listing_id: str, token_data: dict = Depends(verify_jwt_token)
             detail="You can only delete your own listings"
         )
     
-    # Get image URLs before deleting
+    # Get image URLs and location before deleting
     image_urls = listing.images or []
+    listing_id, latitude, longitude = listing.id, listing.latitude, listing.longitude
+    display_latitude, display_longitude = listing.display_latitude, listing.display_longitude
+    category, condition = listing.category, listing.condition
     
-    # Delete the listing
+    # Delete the listing; its images are queued for deletion in the same transaction
     db.delete(listing)
-    db.commit()
-    
-    # Delete images from S3
     if image_urls and isinstance(image_urls, list):
-        for url in image_urls:
-            get_s3_service().delete_image(url)
+        enqueue_image_deletions(db, image_urls)
+    db.commit()
+
+    if SEARCH_BACKEND == 'memory':
+        get_search_index().remove(listing_id)
+    get_cluster_cache().remove(listing_id, display_latitude, display_longitude)
+    get_feed_cache().invalidate(category, condition, latitude, longitude)
+    get_view_counter().forget(listing_id)
     
     return {"message": "Listing deleted successfully"}
 
 @router.get("/search-location/{query}")
-def search_location_endpoint(query: str, db: Session = Depends(get_db)):
+def search_location_endpoint(query: str, request: Request, db: Session = Depends(get_db)):
     """
     Search for a location and return coordinates
     """
@@ -306,29 +712,136 @@ def search_location_endpoint(query: str, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Location not found"
         )
-    return result
+    return conditional_json(request, result, LOCATION_CACHE_CONTROL)
 
 @router.get("/location-suggestions/{query}")
-def get_location_suggestions(query: str, limit: int = 5, db: Session = Depends(get_db)):
+def get_location_suggestions(query: str, request: Request, limit: int = 5, db: Session = Depends(get_db)):
     """
     Get autocomplete suggestions for location search
     """
     suggestions = search_location_suggestions(query, limit, db)
-    return {"suggestions": suggestions}
+    return conditional_json(request, {"suggestions": suggestions}, LOCATION_CACHE_CONTROL)
+
+def listing_display_coords(listing: Listings):
+    """The stored fuzzed location, falling back to computing it for rows the backfill hasn't reached"""
+    if listing.display_latitude is not None and listing.display_longitude is not None:
+        return listing.display_latitude, listing.display_longitude
+    if listing.latitude is None or listing.longitude is None:
+        return None, None
+    return display_coords(listing.id, listing.latitude, listing.longitude)
+
+def format_listing(listing: Listing, seller: Users, projection: Optional[ListingProjection] = None):
+    # Listings are copied into slotted response types rather than returned as
+    # ORM objects, so eager-loaded relationships (seller -> listings -> seller ...)
+    # and private seller columns never reach the encoder.
+    # return approx location, 0.2 < center < 0.5 miles from the real one
+    latitude = longitude = None
+    if projection is None or projection.wants_location:
+        latitude, longitude = listing_display_coords(listing)
+    # distance is only known for radius queries; round it so it can't be used to pin down the exact spot
+    dist_away = round(listing.dist_away, 1) if listing.dist_away is not None else None
+
+    if projection is None:
+        return ListingItem(
+            listing=ListingOut.from_listing(listing, latitude, longitude),
+            seller=SellerOut.from_user(seller),
+            dist_away=dist_away
+        )
+    return ListingItem(
+        listing=projection.listing_fields(listing, latitude, longitude),
+        seller=projection.seller_fields(seller),
+        dist_away=dist_away
+    )
 
-def format_listing(listing: Listing, seller: Users, dist_away: float = None):
-    # return approx location, 0.2 < center < 0.5 miles, using id as a random seed
-    listing.latitude, listing.longitude = generate_coord_offset(str(listing.id), listing.latitude, listing.longitude, 0.2, 0.5)
-    seller_model = User(id=seller.id, fname=seller.fname, lname=seller.lname, email=seller.email, pfp_url=seller.pfp_url)
-    return {
-        "listing": listing,
-        "seller": seller_model,
-        dist_away: dist_away
-    }
+def format_cluster_listing(listing: Listings):
+    return ClusterListingOut(
+        id=listing.id,
+        title=listing.title,
+        price=listing.price,
+        currency=listing.currency,
+        image=listing.images[0] if listing.images else None,
+        location=listing.location,
+    )
+
+def paginate_newest_first(query: Query[Listing], limit: Optional[int], cursor: Optional[str]):
+    """
+    Page through listings newest first, seeking on (created_at, id) so the
+    idx_listings_created_at_id index serves every page.
+    """
+    return keyset_page(
+        query,
+        [(Listings.created_at, datetime.datetime.fromisoformat), (Listings.id, uuid.UUID)],
+        clamp_page_size(limit),
+        cursor,
+        key=lambda listing: (listing.created_at, listing.id)
+    )
+
+def paginate_by_rank(query: Query[Listing], rank, limit: Optional[int], cursor: Optional[str]):
+    """
+    Page through full-text results best match first, breaking ties newest
+    first. `rank` is the expression loaded into Listings.search_rank.
+    """
+    return keyset_page(
+        query,
+        [
+            # ts_rank is a real; compare as real so the cursor value round-trips exactly
+            (rank, lambda value: cast(value, REAL)),
+            (Listings.created_at, datetime.datetime.fromisoformat),
+            (Listings.id, uuid.UUID)
+        ],
+        clamp_page_size(limit),
+        cursor,
+        key=lambda listing: (listing.search_rank, listing.created_at, listing.id)
+    )
+
+def paginate_nearest_first(query: Query[Listing], lat: float, lon: float,
+                           limit: Optional[int], cursor: Optional[str]):
+    """
+    Page through listings closest first, breaking ties by id. The distance
+    is the same expression filter_by_location loads into Listings.dist_away.
+    """
+    return keyset_page(
+        query,
+        [(distance_miles_from(lat, lon), float), (Listings.id, uuid.UUID)],
+        clamp_page_size(limit),
+        cursor,
+        key=lambda listing: (listing.dist_away, listing.id),
+        descending=False
+    )
+
+def validate_sort(sort: Optional[str], lat, lon, dist):
+    if sort and sort not in SORT_OPTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid sort. Allowed: {', '.join(SORT_OPTIONS)}"
+        )
+    if sort == 'distance' and not (lat and lon and dist):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sort=distance requires lat, lon and dist"
+        )
+
+def distance_miles_from(lat: float, lon: float):
+    """
+    SQL expression for each listing's distance in miles from (lat, lon),
+    measured to its display location. Distances are shown to the asker, so
+    measuring to the real spot would let a few searches triangulate it.
+    """
+    return haversine_miles(Listings.display_latitude, Listings.display_longitude, lat, lon)
 
 def filter_by_location(query: Query[Listing], lat: Optional[float] = None,
                        lon: Optional[float] = None,
                        dist: Optional[float] = None):
+    distance = distance_miles_from(lat, lon)
+    if SPATIAL_BACKEND == 'postgis':
+        # ST_DWithin is answered from the GiST index on listings.geog, which holds
+        # the real location, so it reaches out by the most a display location can be off
+        return query.filter(
+            func.ST_DWithin(Listings.geog, geography_point(lat, lon),
+                            (dist + DISPLAY_OFFSET_MAX_MILES) * METERS_PER_MILE),
+            distance <= dist
+        ).options(with_expression(Listings.dist_away, distance))
+
     bounding_box = get_bounding_box_corners(lat, lon, dist)
 
     if bounding_box:
@@ -339,23 +852,32 @@ def filter_by_location(query: Query[Listing], lat: Optional[float] = None,
         lng_min = min(nw[1], sw[1])
         lng_max = max(ne[1], se[1])
 
+        # The box lets idx_listings_display_lat_lng narrow the candidates; the exact
+        # great-circle distance then trims the corners, which reach ~41% past dist
         query = query.filter(
-            Listings.latitude.between(lat_min, lat_max),
-            Listings.longitude.between(lng_min, lng_max)
-        )
+            Listings.display_latitude.between(lat_min, lat_max),
+            Listings.display_longitude.between(lng_min, lng_max),
+            distance <= dist
+        ).options(with_expression(Listings.dist_away, distance))
 
     return query
 
+def get_user_org(db: Session, user_id: Optional[str]) -> Optional[str]:
+    """The email domain of a user, which identifies their organization"""
+    if not user_id:
+        return None
+    return get_org_cache().lookup(db, user_id)
+
 def apply_filters(user_id: str, query: Query[Listing], lat, lon, dist, org_filter, db,
                   category: Optional[str] = None,
-                  condition: Optional[str] = None):
+                  condition: Optional[str] = None,
+                  exclude_own: bool = True):
     if org_filter:
-        # get caller's email
-        asker = db.query(Users).filter(Users.id == user_id).first()
-        if asker:
-            email = asker.email
-            org = email.split('@')[-1]
-            query = query.filter(Users.email.ilike(f"%@{org}"))
+        # get caller's org
+        org = get_user_org(db, user_id)
+        if org:
+            # Served by idx_users_email_domain, then idx_listings_seller_id
+            query = query.filter(Users.email_domain == org)
 
     # Category filter - exact or partial match
     if category:
@@ -365,7 +887,7 @@ def apply_filters(user_id: str, query: Query[Listing], lat, lon, dist, org_filte
     if condition:
         query = query.filter(Listings.condition == condition)
 
-    if user_id:
+    if user_id and exclude_own:
         query = query.filter(Listings.seller_id != user_id)
 
     if lat and lon and dist:
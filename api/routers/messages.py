@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 
 from routers.auth import verify_jwt_token
 from db.database import get_db
+from services.responses import FastJSONResponse
 from services.messaging_service import (
     send_message,
     get_user_messages,
@@ -45,7 +46,7 @@ def get_user_messages_endpoint(
     Get all messages for the current user (both sent and received).
     """
     user_id = token_data['uuid']
-    return get_user_messages(user_id, limit, offset, db)
+    return FastJSONResponse(get_user_messages(user_id, limit, offset, db))
 
 @router.get("/conversation/{other_user_email}")
 def get_conversation_endpoint(
@@ -59,7 +60,7 @@ def get_conversation_endpoint(
     Get conversation between the current user and another user.
     """
     user_id = token_data['uuid']
-    return get_conversation(user_id, other_user_email, limit, offset, db)
+    return FastJSONResponse(get_conversation(user_id, other_user_email, limit, offset, db))
 
 @router.patch("/{message_id}/read")
 def mark_message_read_endpoint(
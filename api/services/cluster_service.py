@@ -0,0 +1,276 @@
+import math
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Float, cast, func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Query, Session
+
+from models import Listings
+from services.location_service import DISPLAY_OFFSET_MAX_MILES
+
+load_dotenv()
+
+# Listings are clustered by their fuzzed display coordinates, never the real
+# ones, so cells and centroids reveal nothing the listing pages don't.
+
+# Deepest zoom a map may ask for
+MAX_ZOOM = 20
+
+MILES_PER_DEGREE_LATITUDE = 69.09
+
+# Grid cells per 256px map tile, i.e. roughly one cluster per 64px square
+CELLS_PER_TILE = 4
+
+# A viewport never returns more than this many cells per axis; wider
+# viewports are clustered at a coarser zoom so payloads stay small
+MAX_CELLS_PER_AXIS = 32
+
+# Zoom levels whose unfiltered grids are kept in memory. Deeper zooms cover
+# small areas and are aggregated in SQL on demand.
+CACHE_MAX_ZOOM = 12
+
+# Seconds before a cached level is rebuilt. add/remove keep a level current
+# for writes made through this process; the rebuild picks up everything else
+# (other workers, migrations and backfills, the orphan sweeper).
+CLUSTER_CACHE_TTL = float(os.getenv("CLUSTER_CACHE_TTL", "60"))
+
+CellKey = Tuple[int, int]
+
+
+def cell_size(zoom: int) -> float:
+    """Grid cell edge in degrees for a web-map zoom level"""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+# Deepest zoom actually clustered at: its cells are still wider than the display
+# offset, so a lone listing's cell doesn't narrow down where it is any further
+CLUSTER_MAX_ZOOM = max(zoom for zoom in range(MAX_ZOOM + 1)
+                       if cell_size(zoom) * MILES_PER_DEGREE_LATITUDE >= DISPLAY_OFFSET_MAX_MILES)
+
+
+def fit_zoom(zoom: int, south: float, west: float, north: float, east: float) -> int:
+    """Lower the zoom to CLUSTER_MAX_ZOOM, then until the viewport spans at most MAX_CELLS_PER_AXIS cells"""
+    zoom = max(0, min(zoom, CLUSTER_MAX_ZOOM))
+    span = max(north - south, east - west)
+    while zoom > 0 and span / cell_size(zoom) > MAX_CELLS_PER_AXIS:
+        zoom -= 1
+    return zoom
+
+
+def cell_of(lat: float, lon: float, zoom: int) -> CellKey:
+    size = cell_size(zoom)
+    return math.floor(lat / size), math.floor(lon / size)
+
+
+def cell_range(zoom: int, south: float, west: float, north: float, east: float):
+    """Inclusive (row, column) bounds of the cells touching the viewport"""
+    (row_min, col_min), (row_max, col_max) = cell_of(south, west, zoom), cell_of(north, east, zoom)
+    return row_min, col_min, row_max, col_max
+
+
+def viewport_filter(zoom: int, south: float, west: float, north: float, east: float):
+    """Criteria selecting listings in the cells touching the viewport, snapped to whole cells"""
+    size = cell_size(zoom)
+    row_min, col_min, row_max, col_max = cell_range(zoom, south, west, north, east)
+    return (
+        Listings.display_latitude >= row_min * size, Listings.display_latitude < (row_max + 1) * size,
+        Listings.display_longitude >= col_min * size, Listings.display_longitude < (col_max + 1) * size
+    )
+
+
+@dataclass
+class Cell:
+    count: int = 0
+    lat_sum: float = 0.0
+    lon_sum: float = 0.0
+    # Newest listing in the cell; None when it was deleted and must be re-read
+    representative_id: Optional[uuid.UUID] = None
+
+    def as_cluster(self, key: CellKey):
+        return {
+            "cell": f"{key[0]}:{key[1]}",
+            "count": self.count,
+            "latitude": self.lat_sum / self.count,
+            "longitude": self.lon_sum / self.count,
+            "representative_id": self.representative_id,
+        }
+
+
+def aggregate_cells(query: Query, zoom: int, south: Optional[float] = None, west: Optional[float] = None,
+                    north: Optional[float] = None, east: Optional[float] = None) -> Dict[CellKey, Cell]:
+    """
+    Group the listings selected by `query` into grid cells at `zoom` with a
+    single GROUP BY, optionally limited to the cells touching a viewport.
+    """
+    size = cell_size(zoom)
+    latitude = cast(Listings.display_latitude, Float)
+    longitude = cast(Listings.display_longitude, Float)
+    row = func.floor(latitude / size)
+    column = func.floor(longitude / size)
+
+    # Rows the display coordinates backfill hasn't reached yet are left out
+    query = query.filter(Listings.display_latitude.isnot(None), Listings.display_longitude.isnot(None))
+    if south is not None:
+        # Snap to whole cells so edge cells are counted in full
+        query = query.filter(*viewport_filter(zoom, south, west, north, east))
+
+    rows = (
+        query.with_entities(
+            row.label('row'),
+            column.label('col'),
+            func.count(Listings.id).label('count'),
+            func.sum(latitude).label('lat_sum'),
+            func.sum(longitude).label('lon_sum'),
+            func.array_agg(aggregate_order_by(Listings.id, Listings.created_at.desc(), Listings.id.desc()))[1]
+                .label('newest_id'),
+        )
+        .group_by(row, column)
+        .all()
+    )
+
+    return {
+        (int(r.row), int(r.col)): Cell(r.count, r.lat_sum, r.lon_sum, r.newest_id)
+        for r in rows
+    }
+
+
+class ClusterCache:
+    """
+    Unfiltered per-cell aggregates for each zoom level up to CACHE_MAX_ZOOM.
+    A level is built with one GROUP BY when it is first requested and again
+    once it is older than `ttl`. In between, add/remove keep it current as
+    listings are created and deleted through this process, so the default
+    map view rarely touches the listings table.
+    """
+
+    def __init__(self, ttl: float = CLUSTER_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._levels: Dict[int, Dict[CellKey, Cell]] = {}
+        self._expires_at: Dict[int, float] = {}
+
+    def _level(self, db: Session, zoom: int) -> Dict[CellKey, Cell]:
+        with self._lock:
+            level = self._levels.get(zoom)
+            if level is not None and self._expires_at.get(zoom, 0) > time.monotonic():
+                return level
+        level = aggregate_cells(db.query(Listings), zoom)
+        with self._lock:
+            self._levels[zoom] = level
+            self._expires_at[zoom] = time.monotonic() + self.ttl
+        return level
+
+    def cells(self, db: Session, zoom: int, south: float, west: float,
+              north: float, east: float, exclude_seller: Optional[str] = None) -> Dict[CellKey, Cell]:
+        """
+        The cached cells touching the viewport. With `exclude_seller`, that
+        seller's listings are taken back out of the copies returned, so
+        logged-in users share the cache without seeing their own listings.
+        """
+        level = self._level(db, zoom)
+        row_min, col_min, row_max, col_max = cell_range(zoom, south, west, north, east)
+
+        visible = {}
+        with self._lock:
+            for row in range(row_min, row_max + 1):
+                for column in range(col_min, col_max + 1):
+                    cell = level.get((row, column))
+                    if cell is not None:
+                        visible[(row, column)] = Cell(**vars(cell))
+
+        if exclude_seller:
+            own = (
+                db.query(Listings.id, Listings.display_latitude, Listings.display_longitude)
+                .filter(Listings.seller_id == exclude_seller, *viewport_filter(zoom, south, west, north, east))
+            )
+            for listing_id, latitude, longitude in own:
+                key = cell_of(float(latitude), float(longitude), zoom)
+                cell = visible.get(key)
+                if cell is None:
+                    continue
+                cell.count -= 1
+                cell.lat_sum -= float(latitude)
+                cell.lon_sum -= float(longitude)
+                if cell.count <= 0:
+                    del visible[key]
+                elif cell.representative_id == listing_id:
+                    cell.representative_id = None
+
+        # Cells whose newest listing was deleted (or is the asker's) get a fresh representative
+        for key, cell in visible.items():
+            if cell.representative_id is None:
+                self._refresh_representative(db, zoom, key, cell, exclude_seller)
+
+        return visible
+
+    def _refresh_representative(self, db: Session, zoom: int, key: CellKey, cell: Cell,
+                                exclude_seller: Optional[str] = None):
+        size = cell_size(zoom)
+        query = db.query(Listings.id).filter(
+            Listings.display_latitude >= key[0] * size, Listings.display_latitude < (key[0] + 1) * size,
+            Listings.display_longitude >= key[1] * size, Listings.display_longitude < (key[1] + 1) * size
+        )
+        if exclude_seller:
+            query = query.filter(Listings.seller_id != exclude_seller)
+        newest = query.order_by(Listings.created_at.desc(), Listings.id.desc()).first()
+        if newest is None:
+            return
+
+        cell.representative_id = newest.id
+        if exclude_seller:
+            return
+        with self._lock:
+            cached = self._levels.get(zoom, {}).get(key)
+            if cached is not None and cached.representative_id is None:
+                cached.representative_id = newest.id
+
+    def add(self, listing_id: uuid.UUID, latitude, longitude):
+        """Count a new listing at its display coordinates"""
+        if latitude is None or longitude is None:
+            return
+        lat, lon = float(latitude), float(longitude)
+
+        with self._lock:
+            for zoom, level in self._levels.items():
+                cell = level.setdefault(cell_of(lat, lon, zoom), Cell())
+                cell.count += 1
+                cell.lat_sum += lat
+                cell.lon_sum += lon
+                # New listings are the newest in their cell
+                cell.representative_id = listing_id
+
+    def remove(self, listing_id: uuid.UUID, latitude, longitude):
+        """Uncount a deleted listing at its display coordinates"""
+        if latitude is None or longitude is None:
+            return
+        lat, lon = float(latitude), float(longitude)
+
+        with self._lock:
+            for zoom, level in self._levels.items():
+                key = cell_of(lat, lon, zoom)
+                cell = level.get(key)
+                if cell is None:
+                    continue
+                cell.count -= 1
+                cell.lat_sum -= lat
+                cell.lon_sum -= lon
+                if cell.count <= 0:
+                    del level[key]
+                elif cell.representative_id == listing_id:
+                    cell.representative_id = None
+
+
+# Create global instance with lazy initialization
+cluster_cache = None
+
+def get_cluster_cache():
+    global cluster_cache
+    if cluster_cache is None:
+        cluster_cache = ClusterCache()
+    return cluster_cache
@@ -0,0 +1,178 @@
+import asyncio
+import datetime
+import os
+from typing import Iterable, List, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import array, insert
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models import Listings, S3Deletions, Users
+from services.image_dedup import content_digest, lock_unreferenced, release, unlock
+from services.s3_service import DELETE_OBJECTS_LIMIT, get_s3_service, object_keys
+
+load_dotenv()
+
+# Seconds between passes over the queue
+DELETE_QUEUE_INTERVAL = float(os.getenv("DELETE_QUEUE_INTERVAL", "10"))
+
+# Failed deletes are retried with exponential backoff, then dead-lettered
+DELETE_MAX_ATTEMPTS = int(os.getenv("DELETE_MAX_ATTEMPTS", "8"))
+DELETE_RETRY_BASE = 30  # seconds
+DELETE_RETRY_MAX = 3600
+
+
+def enqueue_keys(db: Session, keys: Iterable[str]):
+    """Queue bucket keys for deletion as part of db's transaction; keys already queued are left as they are"""
+    rows = [{"key": key} for key in dict.fromkeys(keys)]
+    if rows:
+        db.execute(insert(S3Deletions).values(rows).on_conflict_do_nothing(index_elements=['key']))
+
+
+def enqueue_image_deletions(db: Session, image_urls: Iterable[str], release_references: bool = True):
+    """
+    Queue images and their generated variants for deletion as part of db's
+    transaction. Content-addressed images are only queued once their last
+    reference is released; pass release_references=False for uploads whose
+    references were rolled back with the transaction that took them. URLs
+    outside the bucket, like Google profile pictures, are skipped.
+    """
+    s3_service = get_s3_service()
+    keys = [key for key in map(s3_service.key_from_url, image_urls) if key]
+    if release_references:
+        keys = [key for key in keys if not content_digest(key)] + release(db, keys)
+    enqueue_keys(db, [object_key for key in keys for object_key in object_keys(key)])
+
+
+def claimed_uploads(db: Session, image_urls: List[str]) -> Set[str]:
+    """
+    The URLs among image_urls that a listing or user already references, or
+    that are queued for deletion. A presigned upload can only be attached
+    once; attaching it again would share one object between owners that
+    each delete it.
+    """
+    urls = list(dict.fromkeys(image_urls))
+    if not urls:
+        return set()
+
+    # The models use the generic ARRAY type, which has no overlap(); && is
+    # what idx_listings_images and idx_users_pfp_url answer
+    claimed = set()
+    for (images,) in db.query(Listings.images).filter(Listings.images.op('&&')(array(urls))):
+        claimed.update(images)
+    for (pfp_url,) in db.query(Users.pfp_url).filter(Users.pfp_url.op('&&')(array(urls))):
+        claimed.update(pfp_url)
+
+    s3_service = get_s3_service()
+    keys = {s3_service.key_from_url(url): url for url in urls}
+    queued = db.query(S3Deletions.key).filter(S3Deletions.key.in_([key for key in keys if key]))
+    claimed.update(keys[key] for (key,) in queued)
+    return claimed & set(urls)
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(seconds=min(DELETE_RETRY_BASE * 2 ** (attempts - 1), DELETE_RETRY_MAX))
+
+
+class DeletionQueue:
+    """
+    Deletes queued bucket objects in the background. Each pass claims up to
+    DELETE_OBJECTS_LIMIT due keys with FOR UPDATE SKIP LOCKED, so several API
+    workers can drain the queue side by side, and removes them with one
+    DeleteObjects call.
+    """
+
+    def process_batch(self) -> int:
+        """Delete one batch of due keys; returns how many were claimed"""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(S3Deletions.key, S3Deletions.attempts)
+                .filter(S3Deletions.dead_at.is_(None), S3Deletions.next_attempt_at <= func.now())
+                .order_by(S3Deletions.next_attempt_at)
+                .limit(DELETE_OBJECTS_LIMIT)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not rows:
+                return 0
+
+            keys = [row.key for row in rows]
+
+            # Content-addressed images referenced again since they were queued are kept
+            referenced = lock_unreferenced(db, keys)
+            to_delete = [key for key in keys if key not in referenced]
+
+            try:
+                failed = get_s3_service().delete_keys(to_delete) if to_delete else {}
+            except Exception as e:
+                failed = {key: str(e) for key in to_delete}
+            unlock(db, to_delete)
+
+            deleted = [key for key in keys if key not in failed]
+            if deleted:
+                db.query(S3Deletions).filter(S3Deletions.key.in_(deleted)).delete(synchronize_session=False)
+
+            if failed:
+                now = datetime.datetime.now(datetime.timezone.utc)
+                retries = []
+                for row in rows:
+                    if row.key not in failed:
+                        continue
+                    attempts = row.attempts + 1
+                    dead = attempts >= DELETE_MAX_ATTEMPTS
+                    retries.append({
+                        "key": row.key,
+                        "attempts": attempts,
+                        "last_error": failed[row.key],
+                        "next_attempt_at": now + retry_delay(attempts),
+                        "dead_at": now if dead else None,
+                    })
+                    if dead:
+                        print(f"Giving up deleting {row.key} after {attempts} attempts: {failed[row.key]}")
+                db.execute(update(S3Deletions), retries)
+
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def drain(self) -> int:
+        """Process batches until no due keys are left; returns how many keys were claimed"""
+        total = 0
+        while True:
+            claimed = self.process_batch()
+            total += claimed
+            if claimed < DELETE_OBJECTS_LIMIT:
+                return total
+
+    def stats(self, db: Session):
+        pending, dead = db.query(
+            func.count().filter(S3Deletions.dead_at.is_(None)),
+            func.count().filter(S3Deletions.dead_at.isnot(None))
+        ).one()
+        return {"pending": pending, "dead": dead}
+
+    async def run_periodic(self, interval: float = DELETE_QUEUE_INTERVAL):
+        """Drain the queue on a timer until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.drain)
+            except Exception as e:
+                print(f"Error processing S3 deletion queue: {str(e)}")
+
+
+# Create global instance with lazy initialization
+deletion_queue = None
+
+def get_deletion_queue():
+    global deletion_queue
+    if deletion_queue is None:
+        deletion_queue = DeletionQueue()
+    return deletion_queue
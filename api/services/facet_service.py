@@ -0,0 +1,104 @@
+from typing import Optional
+
+from sqlalchemy import ARRAY, Numeric, cast, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.orm import Query
+
+from models import Listings
+from services.search_index import get_search_index
+from services.search_service import SEARCH_BACKEND, TS_CONFIG, to_prefix_tsquery
+
+# Lower edges of the price histogram buckets; the last bucket is open ended
+PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def filter_by_search(query: Query, q: Optional[str]) -> Optional[Query]:
+    """
+    Restrict a listings query to the rows /listings/search would match for q,
+    using the configured search backend. Returns None when q can't match anything.
+    """
+    if not q:
+        return query
+
+    if SEARCH_BACKEND == 'fts':
+        expression = to_prefix_tsquery(q)
+        if expression is None:
+            return None
+        return query.filter(Listings.search_vector.op('@@')(func.to_tsquery(TS_CONFIG, expression)))
+
+    if SEARCH_BACKEND == 'memory':
+        listing_ids = [listing_id for listing_id, _ in get_search_index().search(q)]
+        if not listing_ids:
+            return None
+        return query.filter(Listings.id.in_(listing_ids))
+
+    return query.filter(or_(Listings.title.ilike(f"%{q}%"), Listings.description.ilike(f"%{q}%")))
+
+
+def empty_facets():
+    return {
+        "total": 0,
+        "categories": [],
+        "conditions": [],
+        "price": {"min": None, "max": None, "histogram": []},
+    }
+
+
+def compute_facets(query: Query):
+    """
+    Category counts, condition counts and a price histogram for the listings
+    selected by `query`, computed in a single statement with
+    GROUP BY GROUPING SETS ((category), (condition), (price bucket), ()).
+    """
+    thresholds = cast(array(PRICE_BUCKETS), ARRAY(Numeric))
+    bucket = func.width_bucket(Listings.price, thresholds)
+
+    rows = (
+        query.with_entities(
+            Listings.category,
+            Listings.condition,
+            bucket.label('bucket'),
+            func.grouping(Listings.category).label('by_category'),
+            func.grouping(Listings.condition).label('by_condition'),
+            func.grouping(bucket).label('by_bucket'),
+            func.count(Listings.id).label('count'),
+            func.min(Listings.price).label('min_price'),
+            func.max(Listings.price).label('max_price'),
+        )
+        .group_by(func.grouping_sets(
+            tuple_(Listings.category), tuple_(Listings.condition), tuple_(bucket), tuple_()
+        ))
+        .all()
+    )
+
+    facets = empty_facets()
+    histogram = {}
+    for row in rows:
+        # grouping(x) is 0 for the grouping set that groups by x
+        if row.by_category == 0:
+            facets["categories"].append({"value": row.category, "count": row.count})
+        elif row.by_condition == 0:
+            facets["conditions"].append({"value": row.condition, "count": row.count})
+        elif row.by_bucket == 0:
+            if row.bucket is not None:
+                histogram[row.bucket] = row.count
+        else:
+            facets["total"] = row.count
+            facets["price"]["min"] = row.min_price
+            facets["price"]["max"] = row.max_price
+
+    facets["categories"].sort(key=lambda facet: (-facet["count"], facet["value"] or ''))
+    facets["conditions"].sort(key=lambda facet: (-facet["count"], facet["value"] or ''))
+
+    # width_bucket numbers buckets from 1; every bucket is listed so clients can draw empty bars
+    if facets["total"]:
+        facets["price"]["histogram"] = [
+            {
+                "min": PRICE_BUCKETS[index],
+                "max": PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None,
+                "count": histogram.get(index + 1, 0),
+            }
+            for index in range(len(PRICE_BUCKETS))
+        ]
+
+    return facets
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from services.location_service import DISPLAY_OFFSET_MAX_MILES, get_bounding_box_corners
+
+load_dotenv()
+
+# Entries kept (0 disables the cache) and how long each one stays valid.
+# Writes on this process invalidate matching entries right away; the TTL
+# bounds staleness from writes made through other workers.
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", "1024"))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+
+@dataclass(frozen=True)
+class FeedScope:
+    """Which listings can appear in a cached page, used for invalidation"""
+    category: Optional[str] = None
+    condition: Optional[str] = None
+    # (lat_min, lat_max, lon_min, lon_max) of the radius query, if any
+    bounds: Optional[Tuple[float, float, float, float]] = None
+
+    @classmethod
+    def for_filters(cls, category: Optional[str], condition: Optional[str],
+                    lat: Optional[float], lon: Optional[float], dist: Optional[float]):
+        bounds = None
+        if lat and lon and dist:
+            # Radius queries match display locations but writes report real ones,
+            # which can be up to DISPLAY_OFFSET_MAX_MILES away
+            corners = get_bounding_box_corners(lat, lon, dist + DISPLAY_OFFSET_MAX_MILES)
+            bounds = (corners['southwest'][0], corners['northeast'][0],
+                      corners['southwest'][1], corners['northeast'][1])
+        return cls(category.lower() if category else None, condition, bounds)
+
+    def covers(self, category: Optional[str], condition: Optional[str], lat, lon) -> bool:
+        # Mirrors apply_filters: category is a substring match, condition exact
+        if self.category and self.category not in (category or '').lower():
+            return False
+        if self.condition and self.condition != condition:
+            return False
+        if self.bounds:
+            if lat is None or lon is None:
+                return False
+            lat_min, lat_max, lon_min, lon_max = self.bounds
+            return lat_min <= float(lat) <= lat_max and lon_min <= float(lon) <= lon_max
+        return True
+
+
+class FeedCache:
+    """
+    LRU + TTL cache of encoded feed/search pages keyed by normalized filter
+    parameters. Creating or deleting a listing drops only the entries whose
+    scope covers that listing's category, condition and location.
+    """
+
+    def __init__(self, max_entries: int = FEED_CACHE_SIZE, ttl: float = FEED_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, FeedScope, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, scope: FeedScope):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, scope, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, category: Optional[str], condition: Optional[str], lat, lon):
+        """Drop every entry that could contain a listing with these attributes"""
+        with self._lock:
+            stale = [key for key, (_, scope, _) in self._entries.items()
+                     if scope.covers(category, condition, lat, lon)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Create global instance with lazy initialization
+feed_cache = None
+
+def get_feed_cache():
+    global feed_cache
+    if feed_cache is None:
+        feed_cache = FeedCache()
+    return feed_cache
@@ -0,0 +1,186 @@
+"""
+Reverse geocoding cache. Coordinates are rounded to GEOCODE_PRECISION
+decimal places (about 1km), which is well inside the city-level names the
+providers return, so nearby listings share one lookup. Answers live in an
+in-memory LRU in front of the geocode_cache table and are refreshed after
+GEOCODE_TTL.
+
+New listings are saved with UNKNOWN_LOCATION on a cache miss and filled in
+by a background task, so creating a listing never waits on the providers.
+
+Usage (from the api directory), to fill in listings still at "Unknown":
+    python -m services.geocode_cache
+"""
+import datetime
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models import GeocodeCache, Listings
+from services.feed_cache import get_feed_cache
+from services.location_service import UNKNOWN_LOCATION, reverse_geocode
+
+load_dotenv()
+
+# Decimal places coordinates are rounded to before lookup (2 is about 1.1km)
+GEOCODE_PRECISION = 2
+
+# Days before a cached location is looked up again
+GEOCODE_TTL = datetime.timedelta(days=int(os.getenv("GEOCODE_TTL_DAYS", "30")))
+
+# Coordinate cells kept in memory
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "10000"))
+
+# Seconds between provider calls in the backfill (Nominatim allows one per second)
+GEOCODE_BACKFILL_DELAY = 1.0
+BACKFILL_BATCH_SIZE = 500
+
+
+def geocode_key(lat, lon) -> Tuple[Decimal, Decimal]:
+    quantum = Decimal(1).scaleb(-GEOCODE_PRECISION)
+    return Decimal(str(lat)).quantize(quantum), Decimal(str(lon)).quantize(quantum)
+
+
+class LocationCache:
+    """LRU of (rounded lat, rounded lon) -> (location, when it was looked up), backed by the geocode_cache table"""
+
+    def __init__(self, max_cells: int = GEOCODE_CACHE_SIZE):
+        self.max_cells = max_cells
+        self._lock = threading.Lock()
+        self._cells: "OrderedDict[Tuple[Decimal, Decimal], Tuple[str, datetime.datetime]]" = OrderedDict()
+
+    def _remember(self, key: Tuple[Decimal, Decimal], location: str, updated_at: datetime.datetime):
+        with self._lock:
+            self._cells[key] = (location, updated_at)
+            self._cells.move_to_end(key)
+            while len(self._cells) > self.max_cells:
+                self._cells.popitem(last=False)
+
+    def lookup(self, db: Session, lat, lon) -> Optional[str]:
+        """The cached location for these coordinates, or None if it's missing or stale"""
+        key = geocode_key(lat, lon)
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - GEOCODE_TTL
+
+        with self._lock:
+            cached = self._cells.get(key)
+            if cached is not None and cached[1] >= cutoff:
+                self._cells.move_to_end(key)
+                return cached[0]
+
+        row = db.query(GeocodeCache.location, GeocodeCache.updated_at).filter(
+            GeocodeCache.lat_key == key[0], GeocodeCache.lon_key == key[1]
+        ).first()
+        if row is None or row.updated_at < cutoff:
+            return None
+
+        self._remember(key, row.location, row.updated_at)
+        return row.location
+
+    def resolve(self, db: Session, lat, lon) -> Optional[str]:
+        """lookup(), asking the providers and caching their answer on a miss; None if they had none"""
+        location = self.lookup(db, lat, lon)
+        if location is not None:
+            return location
+
+        key = geocode_key(lat, lon)
+        # Look up the cell rather than the exact point, so the answer holds for the whole cell
+        location = reverse_geocode(float(key[0]), float(key[1]))
+        if location is None:
+            return None
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        statement = insert(GeocodeCache).values(lat_key=key[0], lon_key=key[1], location=location, updated_at=now)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['lat_key', 'lon_key'],
+            set_={"location": statement.excluded.location, "updated_at": statement.excluded.updated_at}
+        ))
+        db.commit()
+
+        self._remember(key, location, now)
+        return location
+
+    def fill_listing(self, listing_id: uuid.UUID, lat, lon, category: str, condition: str):
+        """Background task: resolve a new listing's location and store it"""
+        db = SessionLocal()
+        try:
+            location = self.resolve(db, lat, lon)
+            if location is None:
+                return
+            db.query(Listings).filter(
+                Listings.id == listing_id,
+                or_(Listings.location.is_(None), Listings.location == UNKNOWN_LOCATION)
+            ).update(
+                # updated_at versions the listing's ETag (services.http_cache)
+                {Listings.location: location, Listings.updated_at: func.now()}, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error filling in location for listing {listing_id}: {str(e)}")
+            return
+        finally:
+            db.close()
+
+        # Cached pages may hold the listing with its placeholder location
+        get_feed_cache().invalidate(category, condition, lat, lon)
+
+
+# Create global instance with lazy initialization
+location_cache = None
+
+def get_location_cache():
+    global location_cache
+    if location_cache is None:
+        location_cache = LocationCache()
+    return location_cache
+
+
+def backfill():
+    """Fill in the location of listings stuck at UNKNOWN_LOCATION (or missing one)"""
+    cache = get_location_cache()
+    db = SessionLocal()
+    try:
+        total, filled = 0, 0
+        last_id = None
+        while True:
+            query = db.query(Listings.id, Listings.latitude, Listings.longitude).filter(
+                or_(Listings.location.is_(None), Listings.location == UNKNOWN_LOCATION),
+                Listings.latitude.isnot(None), Listings.longitude.isnot(None)
+            )
+            if last_id is not None:
+                query = query.filter(Listings.id > last_id)
+            rows = query.order_by(Listings.id).limit(BACKFILL_BATCH_SIZE).all()
+            if not rows:
+                break
+
+            for row in rows:
+                cached = cache.lookup(db, row.latitude, row.longitude) is not None
+                location = cache.resolve(db, row.latitude, row.longitude)
+                if location is not None:
+                    db.query(Listings).filter(Listings.id == row.id).update(
+                        {Listings.location: location, Listings.updated_at: func.now()}, synchronize_session=False
+                    )
+                    db.commit()
+                    filled += 1
+                if not cached:
+                    time.sleep(GEOCODE_BACKFILL_DELAY)
+
+            total += len(rows)
+            last_id = rows[-1].id
+            print(f"  checked {total} listings, filled in {filled}")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    backfill()
@@ -0,0 +1,56 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response, status
+
+from services.responses import FastJSONResponse, encode_json
+
+# Cache-Control for each conditional endpoint. Every response carries an ETag,
+# so once max-age runs out the client revalidates and usually gets a 304.
+LISTING_CACHE_CONTROL = "public, max-age=30"
+USER_LISTINGS_CACHE_CONTROL = "public, no-cache"
+LOCATION_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag hashed from the values that version a response"""
+    return _etag(encode_json(parts))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag (weak comparison, per RFC 9110)"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def conditional_json(request: Request, content: Any, cache_control: str,
+                     etag: Optional[str] = None) -> Response:
+    """
+    Respond with `content` unless the client already has it. Without an
+    explicit etag the body is encoded once and the ETag is its hash, so the
+    304 still skips sending it.
+    """
+    if etag is None:
+        body = encode_json(content)
+        etag = _etag(body)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+        return Response(body, media_type="application/json",
+                        headers={"ETag": etag, "Cache-Control": cache_control})
+
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return FastJSONResponse(content, headers={"ETag": etag, "Cache-Control": cache_control})
@@ -0,0 +1,138 @@
+"""
+Content-addressed storage for listing images (IMAGE_STORAGE=content_addressed).
+
+Each uploaded image is stored once under the SHA-256 of its content, and
+image_blobs counts the listings referencing it. Re-posting a known photo only
+takes another reference, skipping the S3 write; the object is queued for
+deletion once its last reference is released.
+
+References are taken and released inside the caller's transaction. The rows
+they touch stay locked until it ends, which is what keeps the deletion worker
+(and concurrent uploads of the same content) from racing a listing that is
+still being created: see lock_unreferenced. Since taking a reference can wait
+on another request's transaction, async callers must do it, and end the
+transaction, off the event loop.
+"""
+import asyncio
+import os
+from collections import Counter
+from typing import BinaryIO, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Integer, Text, column, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import ImageBlobs
+from services.s3_service import CONTENT_ADDRESSED_PREFIX, get_s3_service
+
+load_dotenv()
+
+# 'per_listing' stores every upload under its listing; 'content_addressed' dedups by content
+IMAGE_STORAGE = os.getenv("IMAGE_STORAGE", "per_listing").lower()
+
+DIGEST_LENGTH = 64
+
+
+def content_digest(key: str) -> Optional[str]:
+    """SHA-256 a content-addressed key (or one of its variants) is named by, None for other keys"""
+    if not key.startswith(CONTENT_ADDRESSED_PREFIX):
+        return None
+    digest = key[len(CONTENT_ADDRESSED_PREFIX):len(CONTENT_ADDRESSED_PREFIX) + DIGEST_LENGTH]
+    return digest if len(digest) == DIGEST_LENGTH else None
+
+
+def acquire(db: Session, keys: List[str]) -> Set[str]:
+    """Take a reference per occurrence of each key; returns the keys that weren't stored yet"""
+    counts = Counter(keys)
+    rows = [{"digest": content_digest(key), "key": key, "refcount": count}
+            for key, count in sorted(counts.items())]
+
+    statement = insert(ImageBlobs).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=['digest'],
+        set_={"refcount": ImageBlobs.refcount + statement.excluded.refcount}
+    ).returning(ImageBlobs.key, ImageBlobs.refcount)
+
+    # A row whose count is exactly what was just added was created by this statement
+    return {key for key, refcount in db.execute(statement) if refcount == counts[key]}
+
+
+def release(db: Session, keys: Iterable[str]) -> List[str]:
+    """Drop a reference per occurrence of each key; returns the keys nothing references any more"""
+    counts = Counter(digest for digest in map(content_digest, keys) if digest)
+    if not counts:
+        return []
+
+    deltas = values(column('digest', Text), column('delta', Integer), name='deltas').data(sorted(counts.items()))
+    rows = db.execute(
+        update(ImageBlobs)
+        .where(ImageBlobs.digest == deltas.c.digest)
+        .values(refcount=ImageBlobs.refcount - deltas.c.delta)
+        .returning(ImageBlobs.digest, ImageBlobs.key, ImageBlobs.refcount)
+    ).all()
+
+    unreferenced = [row for row in rows if row.refcount <= 0]
+    if unreferenced:
+        db.query(ImageBlobs).filter(
+            ImageBlobs.digest.in_([row.digest for row in unreferenced])
+        ).delete(synchronize_session=False)
+    return [row.key for row in unreferenced]
+
+
+def lock_unreferenced(db: Session, keys: List[str]) -> Set[str]:
+    """
+    Before deleting content-addressed keys, insert a placeholder row for
+    each digest that has no references. The insert waits on uncommitted
+    acquire() calls for the same content, and the placeholders make later
+    ones wait until the deletion commits. Returns the keys still referenced,
+    which must not be deleted; the caller removes the placeholders with
+    unlock() once the objects are gone.
+    """
+    digests = {}
+    for key in keys:
+        digest = content_digest(key)
+        if digest:
+            digests.setdefault(digest, key)
+    if not digests:
+        return set()
+
+    locked = set(db.execute(
+        insert(ImageBlobs)
+        .values([{"digest": digest, "key": key, "refcount": 0} for digest, key in sorted(digests.items())])
+        .on_conflict_do_nothing(index_elements=['digest'])
+        .returning(ImageBlobs.digest)
+    ).scalars())
+    return {key for key in keys if content_digest(key) and content_digest(key) not in locked}
+
+
+def unlock(db: Session, keys: List[str]):
+    digests = {digest for digest in map(content_digest, keys) if digest}
+    if digests:
+        db.query(ImageBlobs).filter(
+            ImageBlobs.digest.in_(digests), ImageBlobs.refcount == 0
+        ).delete(synchronize_session=False)
+
+
+async def acquire_images(db: Session, files: List[BinaryIO]) -> Tuple[List[str], List[Tuple[BinaryIO, str, str]]]:
+    """
+    Hash open image files and take a reference on each within db's
+    transaction. Returns every image's URL, in order, and the
+    (file, key, content type) uploads still needed for content not stored yet.
+
+    The references hold row locks until the caller commits or rolls back,
+    which it should also do off the event loop.
+    """
+    s3_service = get_s3_service()
+    hashed = await asyncio.gather(*(s3_service.content_addressed_key_async(fileobj) for fileobj in files))
+
+    keys = [key for key, _ in hashed]
+    # Blocks while another request holding the same content is mid-upload
+    new_keys = await asyncio.to_thread(acquire, db, keys)
+
+    uploads = {}
+    for fileobj, (key, content_type) in zip(files, hashed):
+        if key in new_keys and key not in uploads:
+            uploads[key] = (fileobj, key, content_type)
+
+    return [s3_service.public_url(key) for key in keys], list(uploads.values())
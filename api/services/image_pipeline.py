@@ -0,0 +1,210 @@
+"""
+Derived versions of uploaded listing images.
+
+Each original is decoded once in a worker process and re-encoded as WebP at
+a few sizes, written next to the original under a predictable key:
+
+    listings/<id>/<name>.jpg -> listings/<id>/<name>_thumb.webp
+                                listings/<id>/<name>_medium.webp
+                                listings/<id>/<name>_webp.webp
+
+Variants are generated after the response is sent. Once every image of a
+listing has them, listings.image_variants_ready is set and responses start
+linking them; until then clients show the originals.
+
+Usage (from the api directory), to generate variants for existing listings:
+    python -m services.image_pipeline
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from typing import Collection, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Worker processes decoding and encoding images
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Variant name -> longest edge in pixels (None keeps the original size)
+VARIANTS = {"thumb": 320, "medium": 960, "webp": None}
+WEBP_QUALITY = 80
+
+
+def variant_key(key: str, variant: str) -> str:
+    """Key (or URL) of one variant of an original image"""
+    return f"{key.rsplit('.', 1)[0]}_{variant}.webp"
+
+
+def variant_urls(image_url: str) -> Dict[str, str]:
+    return {variant: variant_key(image_url, variant) for variant in VARIANTS}
+
+
+def listing_variant_urls(image_urls: Optional[List[str]],
+                         ready: Optional[bool]) -> Optional[List[Dict[str, str]]]:
+    """variant_urls of each of a listing's images, or None until the pipeline has produced them all"""
+    if not (ready and get_image_pipeline().enabled):
+        return None
+    return [variant_urls(url) for url in image_urls or []]
+
+
+def render_variants(data: bytes) -> Dict[str, bytes]:
+    """Decode an image once and encode every variant as WebP. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        # Bake in the EXIF orientation; EXIF, XMP and ICC data aren't passed
+        # to save(), so the variants carry no metadata
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    variants = {}
+    for name, size in VARIANTS.items():
+        resized = image.copy()
+        if size:
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        resized.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+        variants[name] = output.getvalue()
+    return variants
+
+
+class ImagePipeline:
+    """
+    Generates image variants on a process pool so decoding and resizing never
+    hold the API's GIL or event loop; S3 reads and writes go through the S3
+    service's thread pool.
+    """
+
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self.enabled = find_spec("PIL") is not None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if not self.enabled:
+            print("Pillow not installed, image variants disabled")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn rather than fork: the API process runs threads (S3 transfers)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def process(self, image_url: str, data: Optional[bytes] = None):
+        """Generate and upload every variant of one image; downloads the original if data isn't given"""
+        from services.s3_service import get_s3_service
+
+        s3_service = get_s3_service()
+        key = s3_service.key_from_url(image_url)
+        if key is None:
+            raise ValueError(f"Not an image in this bucket: {image_url}")
+        if data is None:
+            data = await s3_service.download_image_async(image_url)
+
+        loop = asyncio.get_running_loop()
+        variants = await loop.run_in_executor(self._get_pool(), render_variants, data)
+
+        await asyncio.gather(*(
+            s3_service.upload_image_async(body, variant_key(key, name), 'webp')
+            for name, body in variants.items()
+        ))
+
+    async def ensure(self, image_url: str, new: bool = False):
+        """process() an image unless it already has variants; new images are processed outright"""
+        from services.s3_service import get_s3_service
+
+        s3_service = get_s3_service()
+        key = s3_service.key_from_url(image_url)
+        if not new and key and await s3_service.object_exists_async(variant_key(key, 'thumb')):
+            return
+        await self.process(image_url)
+
+    async def process_listing(self, listing_id, image_urls: List[str], new_urls: Collection[str] = ()):
+        """
+        Background task: make sure every image of a listing has its variants,
+        then mark the listing so responses link them. Images in new_urls were
+        just uploaded; the rest (content shared with another listing, or
+        anything the backfill finds) are only processed if they lack variants.
+        Failures are logged and leave the listing unmarked.
+        """
+        if not self.enabled or not image_urls:
+            return
+
+        results = await asyncio.gather(*(self.ensure(url, url in new_urls) for url in image_urls),
+                                       return_exceptions=True)
+        failed = False
+        for url, result in zip(image_urls, results):
+            if isinstance(result, Exception):
+                print(f"Error generating variants for {url}: {str(result)}")
+                failed = True
+        if not failed:
+            await asyncio.to_thread(mark_variants_ready, listing_id)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def mark_variants_ready(listing_id):
+    from db.database import SessionLocal
+    from models import Listings
+    from sqlalchemy import func
+
+    db = SessionLocal()
+    try:
+        # updated_at versions the listing's ETag (services.http_cache). Cached
+        # feed pages keep linking the originals until their TTL runs out.
+        db.query(Listings).filter(Listings.id == listing_id).update(
+            {Listings.image_variants_ready: True, Listings.updated_at: func.now()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+# Create global instance with lazy initialization
+image_pipeline = None
+
+def get_image_pipeline():
+    global image_pipeline
+    if image_pipeline is None:
+        image_pipeline = ImagePipeline()
+    return image_pipeline
+
+
+async def backfill():
+    """Generate missing variants for listings not marked ready yet, marking them as they complete"""
+    from db.database import SessionLocal
+    from models import Listings
+    from sqlalchemy import or_
+
+    pipeline = get_image_pipeline()
+    if not pipeline.enabled:
+        return
+
+    db = SessionLocal()
+    try:
+        pending = db.query(Listings.id, Listings.images).filter(
+            Listings.images.isnot(None),
+            or_(Listings.image_variants_ready.is_(None), Listings.image_variants_ready.is_(False))
+        ).all()
+    finally:
+        db.close()
+
+    total = 0
+    for start in range(0, len(pending), pipeline.workers):
+        batch = pending[start:start + pipeline.workers]
+        await asyncio.gather(*(pipeline.process_listing(listing_id, images) for listing_id, images in batch))
+        total += len(batch)
+        print(f"  processed {total} listings")
+
+    pipeline.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(backfill())
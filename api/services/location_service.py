@@ -4,7 +4,7 @@ import re
 import math
 import random
 from decimal import Decimal, getcontext
-from typing import Union, Tuple
+from typing import Optional, Union, Tuple
 
 # precision for lat/lon
 getcontext().prec = 12
@@ -13,8 +13,29 @@ load_dotenv()
 
 MAPBOX_TOKEN = os.getenv("MAPBOX_ACCESS_TOKEN")
 
+# Approximate radius of Earth in miles
+EARTH_RADIUS_MILES = 3958.8
+METERS_PER_MILE = 1609.344
+
+# How far the publicly shown location of a listing is moved from the real one
+DISPLAY_OFFSET_MIN_MILES = 0.2
+DISPLAY_OFFSET_MAX_MILES = 0.5
+
+# How radius queries narrow their candidates before the exact distance check,
+# which like all distances shown or sorted by uses the display coordinates:
+#   bbox    - bounding box on display_latitude/display_longitude (default)
+#   postgis - ST_DWithin on the GiST-indexed listings.geog column
+SPATIAL_BACKEND = os.getenv("SPATIAL_BACKEND", "bbox").lower()
+
+# Seconds to wait on each reverse geocoding provider
+GEOCODE_TIMEOUT = float(os.getenv("GEOCODE_TIMEOUT", "5"))
+
+# Location shown for listings that couldn't be reverse geocoded (yet)
+UNKNOWN_LOCATION = "Unknown"
+
 import requests
-from models import UsZipcodes
+from models import Geography, UsZipcodes
+from sqlalchemy import Float, cast, func
 from sqlalchemy.orm import Session
 
 def get_location_from_coords(lat, lon):
@@ -23,6 +44,10 @@ def get_location_from_coords(lat, lon):
     1. OpenStreetMap (primary)
     2. Mapbox (fallback)
     """
+    return reverse_geocode(lat, lon) or UNKNOWN_LOCATION
+
+def reverse_geocode(lat, lon) -> Optional[str]:
+    """get_location_from_coords, but None when neither provider had an answer"""
     # --- Try OpenStreetMap first ---
     try:
         osm_url = f"https://nominatim.openstreetmap.org/reverse"
@@ -34,7 +59,8 @@ def get_location_from_coords(lat, lon):
                 "format": "json",
                 "addressdetails": 1
             },
-            headers={"User-Agent": "YourAppName/1.0"}
+            headers={"User-Agent": "YourAppName/1.0"},
+            timeout=GEOCODE_TIMEOUT
         )
         osm_data = osm_res.json()
         address = osm_data.get("address", {})
@@ -56,7 +82,7 @@ def get_location_from_coords(lat, lon):
     try:
         print('using mapbox')
         mapbox_url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{lon},{lat}.json"
-        mapbox_res = requests.get(mapbox_url, params={"access_token": MAPBOX_TOKEN})
+        mapbox_res = requests.get(mapbox_url, params={"access_token": MAPBOX_TOKEN}, timeout=GEOCODE_TIMEOUT)
         mapbox_data = mapbox_res.json()
 
         city, state, country = None, None, None
@@ -77,7 +103,7 @@ def get_location_from_coords(lat, lon):
     except Exception:
         pass
 
-    return "Unknown"
+    return None
 
 def search_us_zipcode_db(query, db: Session):
     """
@@ -224,12 +250,9 @@ def get_bounding_box_corners(lat, lon, distance_miles):
     Returns 4 corner coordinates (NE, NW, SE, SW) of a square
     bounding box `distance_miles` away from the center in all directions.
     """
-    # Approximate radius of Earth in miles
-    R = 3958.8
-
     # Convert distance in miles to angular distance in radians
-    delta_lat = distance_miles / R
-    delta_lon = distance_miles / (R * math.cos(math.radians(lat)))
+    delta_lat = distance_miles / EARTH_RADIUS_MILES
+    delta_lon = distance_miles / (EARTH_RADIUS_MILES * math.cos(math.radians(lat)))
 
     # Convert angular distances to degrees
     delta_lat_deg = math.degrees(delta_lat)
@@ -248,6 +271,35 @@ def get_bounding_box_corners(lat, lon, distance_miles):
         "southwest": southwest
     }
 
+def haversine_miles(lat_column, lon_column, lat: float, lon: float):
+    """
+    SQL expression for the great-circle distance in miles between each row's
+    (lat_column, lon_column) and the point (lat, lon). Postgres evaluates it
+    over the whole candidate set inside the query, so no per-row Python math.
+    """
+    row_lat = func.radians(cast(lat_column, Float), type_=Float)
+    row_lon = func.radians(cast(lon_column, Float), type_=Float)
+    center_lat = math.radians(lat)
+    center_lon = math.radians(lon)
+
+    a = (
+        func.power(func.sin((row_lat - center_lat) / 2.0, type_=Float), 2, type_=Float)
+        + func.cos(row_lat, type_=Float) * math.cos(center_lat)
+        * func.power(func.sin((row_lon - center_lon) / 2.0, type_=Float), 2, type_=Float)
+    )
+    # least() guards asin against rounding error pushing sqrt(a) just above 1
+    return 2 * EARTH_RADIUS_MILES * func.asin(func.least(1.0, func.sqrt(a)), type_=Float)
+
+def distance_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in miles between two points; the Python twin of haversine_miles"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+def geography_point(lat: float, lon: float):
+    """SQL expression for a WGS84 geography point (note PostGIS takes lon first)"""
+    return cast(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326), Geography)
+
 def generate_coord_offset(seed: str, lat: Union[float, Decimal],
                           lon: Union[float, Decimal],
                           min_distance_miles: float = 0.2,
@@ -270,4 +322,13 @@ def generate_coord_offset(seed: str, lat: Union[float, Decimal],
 
     return Decimal(str(lat + lat_offset)), Decimal(str(lon + lng_offset))
 
+def display_coords(listing_id, lat, lon) -> Tuple[Decimal, Decimal]:
+    """
+    Public coordinates for a listing: 0.2 < distance < 0.5 miles from the real
+    spot, seeded by the listing id so they never change. Computed once when the
+    listing is written and stored in display_latitude/display_longitude.
+    """
+    return generate_coord_offset(str(listing_id), lat, lon,
+                                 DISPLAY_OFFSET_MIN_MILES, DISPLAY_OFFSET_MAX_MILES)
+
 # {'northeast': (37.144730169528856, -120.81877819392193), 'northwest': (37.144730169528856, -121.18122180607807), 'southeast': (36.855269830471144, -120.81877819392193), 'southwest': (36.855269830471144, -121.18122180607807)}
\ No newline at end of file
@@ -1,31 +1,25 @@
 from typing import List, Dict, Any
 from fastapi import HTTPException
 from models import Users, Messages
+from services.responses import MessageOut
 from sqlalchemy.orm import Session
 import uuid
 import datetime
 
-def get_all_messages(query, db: Session):
-    result = []
-    for msg in query:
-        # Get sender and receiver info
-        sender = db.query(Users).filter(Users.id == msg.sender_id).first()
-        receiver = db.query(Users).filter(Users.id == msg.receiver_id).first()
+def get_all_messages(query, db: Session) -> List[MessageOut]:
+    messages = list(query)
 
-        result.append({
-            "message_id": str(msg.id),
-            "sender_id": str(msg.sender_id),
-            "receiver_id": str(msg.receiver_id),
-            "content": msg.content,
-            "created_at": msg.created_at.isoformat() if msg.created_at else None,
-            "read_at": msg.read_at.isoformat() if msg.read_at else None,
-            "sender_email": sender.email if sender else None,
-            "receiver_email": receiver.email if receiver else None,
-            "sender_name": f"{sender.fname} {sender.lname}" if sender else None,
-            "receiver_name": f"{receiver.fname} {receiver.lname}" if receiver else None
-        })
+    # Get sender and receiver info for every message in one query
+    user_ids = {msg.sender_id for msg in messages} | {msg.receiver_id for msg in messages}
+    users = {
+        user.id: user
+        for user in db.query(Users.id, Users.email, Users.fname, Users.lname).filter(Users.id.in_(user_ids))
+    } if user_ids else {}
 
-    return result
+    return [
+        MessageOut.from_message(msg, users.get(msg.sender_id), users.get(msg.receiver_id))
+        for msg in messages
+    ]
 
 def send_message(sender_id: str, receiver_email: str, content: str, db: Session) -> Dict[str, Any]:
     """
@@ -55,7 +49,7 @@ def send_message(sender_id: str, receiver_email: str, content: str, db: Session)
         "created_at": new_message.created_at.isoformat() if new_message.created_at else None
     }
 
-def get_user_messages(user_id: str, limit: int = 50, offset: int = 0, db: Session = None) -> List[Dict[str, Any]]:
+def get_user_messages(user_id: str, limit: int = 50, offset: int = 0, db: Session = None) -> List[MessageOut]:
     """
     Get all messages for a user (both sent and received).
     """
@@ -77,7 +71,7 @@ def get_user_messages(user_id: str, limit: int = 50, offset: int = 0, db: Sessio
         
     return get_all_messages(query, db)
 
-def get_conversation(user_id: str, other_user_email: str, limit: int = 50, offset: int = 0, db: Session = None) -> List[Dict[str, Any]]:
+def get_conversation(user_id: str, other_user_email: str, limit: int = 50, offset: int = 0, db: Session = None) -> List[MessageOut]:
     """
     Get conversation between two users.
     """
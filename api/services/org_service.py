@@ -0,0 +1,76 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from models import Users
+
+load_dotenv()
+
+# Users whose organization is kept in memory
+ORG_CACHE_SIZE = int(os.getenv("ORG_CACHE_SIZE", "50000"))
+
+
+def email_domain(email: Optional[str]) -> Optional[str]:
+    """The lowercased domain of an email address, which identifies the user's organization"""
+    if not email or '@' not in email:
+        return None
+    return email.rsplit('@', 1)[-1].strip().lower() or None
+
+
+class OrgCache:
+    """
+    LRU map of user id -> email domain, so org-filtered feeds don't load the
+    asker's user row on every request. A user's email never changes, so
+    entries only leave the cache through eviction or account deletion.
+    """
+
+    def __init__(self, max_users: int = ORG_CACHE_SIZE):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._orgs: "OrderedDict[uuid.UUID, str]" = OrderedDict()
+
+    def lookup(self, db: Session, user_id) -> Optional[str]:
+        try:
+            user_uuid = uuid.UUID(str(user_id))
+        except ValueError:
+            return None
+
+        with self._lock:
+            org = self._orgs.get(user_uuid)
+            if org is not None:
+                self._orgs.move_to_end(user_uuid)
+                return org
+
+        row = db.query(Users.email, Users.email_domain).filter(Users.id == user_uuid).first()
+        if row is None:
+            return None
+        # Rows the users_email_domain backfill hasn't reached yet
+        org = row.email_domain or email_domain(row.email)
+        if org is None:
+            return None
+
+        with self._lock:
+            self._orgs[user_uuid] = org
+            self._orgs.move_to_end(user_uuid)
+            while len(self._orgs) > self.max_users:
+                self._orgs.popitem(last=False)
+        return org
+
+    def forget(self, user_id):
+        with self._lock:
+            self._orgs.pop(uuid.UUID(str(user_id)), None)
+
+
+# Create global instance with lazy initialization
+org_cache = None
+
+def get_org_cache():
+    global org_cache
+    if org_cache is None:
+        org_cache = OrgCache()
+    return org_cache
@@ -0,0 +1,133 @@
+"""
+Finds bucket objects under listings/ and profilepics/ that no listing or user
+references any more (failed cleanups, presigned uploads that were never
+attached) and queues them for deletion.
+
+The bucket listing and the referenced keys are both read as sorted streams
+and merged, so memory use stays flat however many objects the bucket holds:
+S3 lists keys in UTF-8 byte order and Postgres sorts the references with the
+"C" collation, which is the same order. Objects younger than
+ORPHAN_GRACE_PERIOD are never touched, which covers uploads for listings
+still being created.
+
+Usage (from the api directory):
+    python -m services.orphan_sweeper           # report orphans
+    python -m services.orphan_sweeper --delete  # queue them for deletion
+"""
+import datetime
+import os
+import sys
+from typing import Iterator, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from db.database import SessionLocal, engine
+from services.deletion_queue import enqueue_keys
+from services.image_pipeline import VARIANTS
+from services.s3_service import DELETE_OBJECTS_LIMIT, UPLOAD_MAX_AGE, S3Service, get_s3_service
+
+load_dotenv()
+
+SWEEP_PREFIXES = ('listings/', 'profilepics/')
+
+# Unreferenced objects are only deleted once they are this old; keep it well
+# above UPLOAD_MAX_AGE so an upload can't be attached after it was swept
+ORPHAN_GRACE_PERIOD = int(os.getenv("ORPHAN_GRACE_PERIOD", str(24 * 3600)))
+
+# Referenced keys fetched per round trip from the server-side cursor
+SWEEP_FETCH_SIZE = 10000
+
+# Every key an image URL in the database accounts for, with the variant keys
+# services.image_pipeline.variant_key derives from it
+REFERENCED_KEYS_SQL = """
+    WITH urls AS (
+        SELECT unnest(images) AS url FROM listings WHERE images IS NOT NULL
+        UNION ALL
+        SELECT unnest(pfp_url) AS url FROM users WHERE pfp_url IS NOT NULL
+    ), keys AS (
+        SELECT substring(url from :pattern) AS key FROM urls
+    )
+    SELECT key FROM (
+        SELECT key FROM keys WHERE key LIKE :prefix
+        UNION ALL
+        SELECT regexp_replace(key, '\\.[^.]*$', '') || '_' || variant || '.webp'
+        FROM keys, unnest(CAST(:variants AS text[])) AS variant
+        WHERE key LIKE :prefix
+    ) refs
+    ORDER BY key COLLATE "C"
+"""
+
+
+def bucket_objects(s3_service: S3Service, prefix: str) -> Iterator[Tuple[str, datetime.datetime]]:
+    """(key, last modified) of every object under prefix, a page of 1,000 at a time, in key order"""
+    paginator = s3_service.s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_service.bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            yield obj['Key'], obj['LastModified']
+
+
+def referenced_keys(conn, s3_service: S3Service, prefix: str) -> Iterator[str]:
+    """Keys under prefix that the database references, sorted, streamed from a server-side cursor"""
+    result = conn.execution_options(stream_results=True, yield_per=SWEEP_FETCH_SIZE).execute(
+        text(REFERENCED_KEYS_SQL),
+        {"pattern": s3_service.url_key_pattern(), "prefix": f"{prefix}%", "variants": list(VARIANTS)}
+    )
+    for (key,) in result:
+        yield key
+
+
+def find_orphans(conn, s3_service: S3Service, prefix: str, cutoff: datetime.datetime) -> Iterator[str]:
+    """Merge the bucket listing with the referenced keys, yielding unreferenced keys older than cutoff"""
+    references = referenced_keys(conn, s3_service, prefix)
+    reference = next(references, None)
+
+    for key, last_modified in bucket_objects(s3_service, prefix):
+        while reference is not None and reference < key:
+            reference = next(references, None)
+        if reference == key:
+            continue
+        if last_modified < cutoff:
+            yield key
+
+
+def sweep(delete: bool = False) -> int:
+    """Report (or queue for deletion) orphaned objects under SWEEP_PREFIXES; returns how many were found"""
+    s3_service = get_s3_service()
+    if ORPHAN_GRACE_PERIOD <= UPLOAD_MAX_AGE:
+        raise ValueError("ORPHAN_GRACE_PERIOD must be longer than UPLOAD_MAX_AGE")
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=ORPHAN_GRACE_PERIOD)
+
+    total = 0
+    for prefix in SWEEP_PREFIXES:
+        batch = []
+        with engine.connect() as conn:
+            for key in find_orphans(conn, s3_service, prefix, cutoff):
+                total += 1
+                if not delete:
+                    print(f"  orphan: {key}")
+                    continue
+                batch.append(key)
+                if len(batch) == DELETE_OBJECTS_LIMIT:
+                    queue_orphans(batch)
+                    print(f"  queued {total} orphans for deletion")
+                    batch = []
+        if batch:
+            queue_orphans(batch)
+            print(f"  queued {total} orphans for deletion")
+
+    print(f"Found {total} orphaned objects")
+    return total
+
+
+def queue_orphans(keys):
+    db = SessionLocal()
+    try:
+        enqueue_keys(db, keys)
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sweep(delete='--delete' in sys.argv[1:])
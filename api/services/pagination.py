@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import ColumnElement, literal, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Keep a client supplied page size within [1, MAX_PAGE_SIZE]"""
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Encode the sort key of the last row on a page as an opaque cursor.
+    Datetimes, UUIDs and Decimals are stored as strings.
+    """
+    payload = json.dumps(list(values), default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, parsers: Sequence[Callable[[Any], Any]]) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor, converting each value back
+    with the matching parser. Raises a 400 if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("cursor has the wrong shape")
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_page(query, columns: Sequence[Tuple[Any, Callable[[Any], Any]]], limit: int,
+                cursor: Optional[str], key: Callable[[Any], Sequence[Any]],
+                descending: bool = True):
+    """
+    Fetch one page of `query` ordered by `columns`, starting after `cursor`.
+
+    `columns` is a list of (sql expression, parser) pairs forming a unique sort
+    key; the parser turns the JSON value stored in the cursor back into
+    something comparable with the expression. `key` returns the sort values of
+    a result row. Seeking with a row-value comparison instead of OFFSET means
+    deep pages cost the same as the first one, provided an index matches the
+    sort key.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    expressions = [expression for expression, _ in columns]
+
+    if cursor:
+        values = decode_cursor(cursor, [parse for _, parse in columns])
+        after = tuple_(*[
+            value if isinstance(value, ColumnElement) else literal(value, expression.type)
+            for expression, value in zip(expressions, values)
+        ])
+        sort_key = tuple_(*expressions)
+        query = query.filter(sort_key < after if descending else sort_key > after)
+
+    ordering = [expression.desc() if descending else expression.asc() for expression in expressions]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key(rows[-1]))
+
+    return rows, next_cursor
@@ -0,0 +1,131 @@
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Load, load_only, with_expression
+
+from models import Listings, Users
+from services.image_pipeline import listing_variant_urls
+from services.responses import ListingOut, SellerCardOut, SellerOut
+
+LISTING_VIEWS = ('full', 'card')
+
+# Every field a listing response can carry, in response order
+LISTING_FIELDS = tuple(field.name for field in dataclass_fields(ListingOut))
+
+# What a feed card shows; description and images are trimmed in SQL for cards
+CARD_FIELDS = ('id', 'title', 'description', 'price', 'currency', 'images', 'image_variants',
+               'location', 'latitude', 'longitude', 'created_at')
+CARD_DESCRIPTION_LENGTH = 120
+
+_LOCATION_COLUMNS = (Listings.latitude, Listings.longitude,
+                     Listings.display_latitude, Listings.display_longitude)
+
+# Loaded whatever was asked for: the keyset pagination key and the seller join
+_ALWAYS_LOADED = (Listings.id, Listings.created_at, Listings.seller_id)
+
+
+@dataclass(frozen=True)
+class ListingProjection:
+    """
+    A subset of listing fields to load and return. `card` swaps the full
+    description and image list for a short description and the first image,
+    both computed in SQL so the full values never leave the database.
+    """
+    fields: Tuple[str, ...]
+    card: bool = False
+
+    @property
+    def wants_location(self) -> bool:
+        return 'latitude' in self.fields or 'longitude' in self.fields
+
+    @property
+    def wants_images(self) -> bool:
+        return 'images' in self.fields or 'image_variants' in self.fields
+
+    def _columns(self):
+        columns = list(_ALWAYS_LOADED)
+        for field in self.fields:
+            if field in ('latitude', 'longitude'):
+                columns.extend(_LOCATION_COLUMNS)
+            elif self.card and field in ('description', 'images'):
+                continue
+            elif self.card and field == 'image_variants':
+                columns.append(Listings.image_variants_ready)
+            elif field == 'image_variants':
+                columns.extend((Listings.images, Listings.image_variants_ready))
+            else:
+                columns.append(getattr(Listings, field))
+        return list(dict.fromkeys(columns))
+
+    def load_options(self, with_seller: bool = True):
+        """Loader options pushing the projection into the listings (and joined seller) SELECT"""
+        options = [load_only(*self._columns())]
+        if self.card and 'description' in self.fields:
+            options.append(with_expression(
+                Listings.description_preview, func.left(Listings.description, CARD_DESCRIPTION_LENGTH)
+            ))
+        if self.card and self.wants_images:
+            options.append(with_expression(Listings.first_image, Listings.images[1]))
+        if with_seller and self.card:
+            options.append(Load(Listings).contains_eager(Listings.seller).load_only(
+                Users.id, Users.fname, Users.lname, Users.email
+            ))
+        return options
+
+    def listing_fields(self, listing: Listings, latitude, longitude) -> dict:
+        data = {}
+        for field in self.fields:
+            if field == 'latitude':
+                data[field] = latitude
+            elif field == 'longitude':
+                data[field] = longitude
+            elif self.card and field == 'description':
+                data[field] = listing.description_preview
+            elif self.card and field == 'images':
+                data[field] = [listing.first_image] if listing.first_image else []
+            elif self.card and field == 'image_variants':
+                first_image = [listing.first_image] if listing.first_image else []
+                data[field] = listing_variant_urls(first_image, listing.image_variants_ready)
+            elif field == 'image_variants':
+                data[field] = listing_variant_urls(listing.images, listing.image_variants_ready)
+            else:
+                data[field] = getattr(listing, field)
+        return data
+
+    def seller_fields(self, seller: Users):
+        if self.card:
+            return SellerCardOut(seller.id, seller.fname, seller.lname, seller.email)
+        return SellerOut.from_user(seller)
+
+
+def parse_projection(view: Optional[str], fields: Optional[str]) -> Optional[ListingProjection]:
+    """
+    Build the projection for a `view` / `fields` query, or None for full
+    listings. `fields` is a comma separated subset of LISTING_FIELDS and
+    narrows whatever the view would return. Raises a 400 on unknown names.
+    """
+    if view and view not in LISTING_VIEWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid view. Allowed: {', '.join(LISTING_VIEWS)}"
+        )
+
+    card = view == 'card'
+    selected = CARD_FIELDS if card else LISTING_FIELDS
+
+    if fields:
+        requested = {field.strip() for field in fields.split(',') if field.strip()}
+        unknown = requested - set(LISTING_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(LISTING_FIELDS)}"
+            )
+        # id is always returned so clients can link to the listing
+        selected = tuple(field for field in selected if field in requested or field == 'id')
+    elif not card:
+        return None
+
+    return ListingProjection(selected, card)
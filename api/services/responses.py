@@ -0,0 +1,153 @@
+import datetime
+import decimal
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import orjson
+from fastapi.encoders import decimal_encoder
+from fastapi.responses import JSONResponse
+
+from models import Listings, Messages, Users
+from services.image_pipeline import listing_variant_urls
+
+
+def _default(value: Any):
+    # orjson handles UUIDs, datetimes and dataclasses itself; Decimals are
+    # written the way jsonable_encoder writes them
+    if isinstance(value, decimal.Decimal):
+        return decimal_encoder(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson. Endpoints return it directly with the
+    slotted types below so FastAPI skips jsonable_encoder, which otherwise
+    walks every field of every row in Python.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+@dataclass(slots=True)
+class SellerOut:
+    id: uuid.UUID
+    fname: str
+    lname: str
+    email: str
+    pfp_url: Optional[List[str]]
+
+    @classmethod
+    def from_user(cls, user: Users):
+        return cls(user.id, user.fname, user.lname, user.email, user.pfp_url)
+
+
+@dataclass(slots=True)
+class SellerCardOut:
+    id: uuid.UUID
+    fname: str
+    lname: str
+    email: str
+
+
+@dataclass(slots=True)
+class ListingOut:
+    id: uuid.UUID
+    title: str
+    description: str
+    price: decimal.Decimal
+    currency: Optional[str]
+    category: str
+    condition: str
+    status: Optional[str]
+    views: Optional[int]
+    seller_id: uuid.UUID
+    images: Optional[List[str]]
+    # Per image: thumb / medium / webp URLs (services.image_pipeline), None until they exist
+    image_variants: Optional[List[Dict[str, str]]]
+    created_at: Optional[datetime.datetime]
+    updated_at: Optional[datetime.datetime]
+    latitude: Optional[decimal.Decimal]
+    longitude: Optional[decimal.Decimal]
+    location: Optional[str]
+    tags: Optional[List[str]]
+
+    @classmethod
+    def from_listing(cls, listing: Listings, latitude, longitude):
+        """Public fields of a listing, placed at the given (fuzzed) coordinates"""
+        return cls(
+            listing.id, listing.title, listing.description, listing.price, listing.currency,
+            listing.category, listing.condition, listing.status, listing.views, listing.seller_id,
+            listing.images, listing_variant_urls(listing.images, listing.image_variants_ready),
+            listing.created_at, listing.updated_at, latitude, longitude,
+            listing.location, listing.tags
+        )
+
+
+@dataclass(slots=True)
+class ListingItem:
+    # A dict when only some fields were requested (services.projection)
+    listing: Union[ListingOut, dict]
+    seller: Union[SellerOut, SellerCardOut]
+    dist_away: Optional[float]
+
+
+@dataclass(slots=True)
+class ClusterListingOut:
+    id: uuid.UUID
+    title: str
+    price: decimal.Decimal
+    currency: Optional[str]
+    image: Optional[str]
+    location: Optional[str]
+
+
+@dataclass(slots=True)
+class MessageOut:
+    message_id: uuid.UUID
+    sender_id: uuid.UUID
+    receiver_id: uuid.UUID
+    content: str
+    created_at: Optional[datetime.datetime]
+    read_at: Optional[datetime.datetime]
+    sender_email: Optional[str]
+    receiver_email: Optional[str]
+    sender_name: Optional[str]
+    receiver_name: Optional[str]
+
+    @classmethod
+    def from_message(cls, msg: Messages, sender: Optional[Users], receiver: Optional[Users]):
+        return cls(
+            msg.id, msg.sender_id, msg.receiver_id, msg.content, msg.created_at, msg.read_at,
+            sender.email if sender else None,
+            receiver.email if receiver else None,
+            f"{sender.fname} {sender.lname}" if sender else None,
+            f"{receiver.fname} {receiver.lname}" if receiver else None
+        )
+
+
+@dataclass(slots=True)
+class ProfileOut:
+    """Every users column except the password hash"""
+    id: uuid.UUID
+    fname: str
+    lname: str
+    email: str
+    email_domain: Optional[str]
+    created_at: Optional[datetime.datetime]
+    updated_at: Optional[datetime.datetime]
+    is_admin: Optional[bool]
+    email_verified: Optional[bool]
+    google_id: Optional[str]
+    pfp_url: Optional[List[str]]
+
+    @classmethod
+    def from_user(cls, user: Users):
+        return cls(user.id, user.fname, user.lname, user.email, user.email_domain, user.created_at,
+                   user.updated_at, user.is_admin, user.email_verified, user.google_id, user.pfp_url)
@@ -1,8 +1,116 @@
+import asyncio
+import functools
+import hashlib
 import os
+import re
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from services.image_pipeline import VARIANTS, variant_key
+
+# Transfers run on this many threads, each with its own pooled connection
+S3_MAX_WORKERS = int(os.getenv('S3_MAX_WORKERS', '8'))
+
+# Attempts per request; botocore retries throttling, 5xx and connection errors
+# with exponential backoff and jitter
+S3_MAX_ATTEMPTS = int(os.getenv('S3_MAX_ATTEMPTS', '4'))
+
+# Point the client at an S3-compatible stand-in (MinIO, moto server, ...) for
+# local development; objects are then addressed path-style under it
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+
+ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp'}
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', str(5 * 1024 * 1024)))  # 5MB
+
+# Uploads larger than this go up as a multipart upload, one part in memory at a time
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', str(8 * 1024 * 1024)))
+
+# Enough leading bytes to tell the accepted image formats apart
+IMAGE_HEADER_SIZE = 12
+
+# Listing images stored under the SHA-256 of their content (services.image_dedup)
+CONTENT_ADDRESSED_PREFIX = 'listings/sha256/'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Most keys a single DeleteObjects request accepts
+DELETE_OBJECTS_LIMIT = 1000
+
+# How long a presigned upload stays usable
+UPLOAD_INTENT_TTL = int(os.getenv('UPLOAD_INTENT_TTL', '600'))
+
+# Uploads older than this can no longer be attached, so the orphan sweeper
+# can delete unattached ones once its (longer) grace period has passed
+UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', str(6 * 3600)))
+
+def detect_image_type(header: bytes) -> Optional[Tuple[str, str]]:
+    """(extension, content type) of an image from its leading bytes, or None if it isn't JPEG, PNG or WebP"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg', 'image/jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png', 'image/png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+def sniff_image(fileobj: BinaryIO) -> Tuple[str, str]:
+    """detect_image_type for an open upload, leaving it rewound. Raises ValueError for anything else."""
+    fileobj.seek(0)
+    image_type = detect_image_type(fileobj.read(IMAGE_HEADER_SIZE))
+    fileobj.seek(0)
+    if image_type is None:
+        raise ValueError("Invalid file type. Allowed: jpg, png, webp")
+    return image_type
+
+
+def object_keys(key: str) -> List[str]:
+    """An image's key followed by the keys of its generated variants"""
+    return [key] + [variant_key(key, variant) for variant in VARIANTS]
+
+
+class SizeLimitedReader:
+    """
+    Read-only view of a file that raises ValueError as soon as reading goes
+    past max_size, so an oversized upload fails part way through the transfer
+    instead of after it. Tracks the file position rather than a byte count,
+    since the transfer may rewind and re-read on retries.
+    """
+
+    def __init__(self, fileobj: BinaryIO, max_size: int):
+        self._fileobj = fileobj
+        self._max_size = max_size
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            # Never pull more than one byte past the limit into memory
+            size = max(self._max_size + 1 - self._fileobj.tell(), 0)
+        data = self._fileobj.read(size)
+        if self._fileobj.tell() > self._max_size:
+            raise ValueError(f"Image is too large. Maximum size is {self._max_size // (1024 * 1024)}MB.")
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._fileobj.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._fileobj.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        # The transfer closes its source when done; the file belongs to the caller
+        pass
+
 
 class S3Service:
     def __init__(self):
@@ -19,32 +127,91 @@ class S3Service:
         if not self.bucket_name:
             raise ValueError("S3_BUCKET_NAME environment variable is required")
         
+        # boto3 clients are thread safe, so one client and its connection
+        # pool are shared by every transfer thread
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=aws_access_key,
             aws_secret_access_key=aws_secret_key,
-            region_name=aws_region
+            region_name=aws_region,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=Config(
+                max_pool_connections=S3_MAX_WORKERS,
+                retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'}
+            )
+        )
+
+        # Blocking boto3 calls from async endpoints run here instead of on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=S3_MAX_WORKERS, thread_name_prefix='s3')
+
+        # Streamed uploads already run on an executor thread, so each one
+        # transfers its parts in that thread rather than starting more
+        self._transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_THRESHOLD,
+            use_threads=False
         )
 
-    def upload_profile_picture(self, file_content: bytes, file_extension: str, user_id: str) -> str:
-        """Upload profile picture to S3 and return the public URL"""
+    async def _run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args))
+
+    def upload_profile_picture(self, fileobj: BinaryIO, user_id: str) -> str:
+        """Stream a profile picture to S3 and return the public URL"""
+        file_extension, content_type = sniff_image(fileobj)
 
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"profilepics/{user_id}/{timestamp}.{file_extension}"
 
-        return self.upload_image(file_content, filename, file_extension)
+        return self.upload_image_stream(fileobj, filename, content_type)
 
         
-    def upload_listing_image(self, file_content: bytes, file_extension: str, listing_id: str) -> str:
+    def upload_listing_image(self, fileobj: BinaryIO, listing_id: str) -> str:
         """
-        Upload a listing image to S3 and return the public URL
+        Stream a listing image to S3 and return the public URL
         """
+        file_extension, content_type = sniff_image(fileobj)
+
         # Generate unique filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         unique_id = str(uuid.uuid4())[:8]
         filename = f"listings/{listing_id}/{timestamp}_{unique_id}.{file_extension}"
 
-        return self.upload_image(file_content, filename, file_extension)
+        return self.upload_image_stream(fileobj, filename, content_type)
+
+    def content_addressed_key(self, fileobj: BinaryIO) -> Tuple[str, str]:
+        """
+        (key, content type) for an open image named by the SHA-256 of its
+        content, read in chunks and left rewound. Raises ValueError for
+        anything that isn't an accepted image of at most MAX_IMAGE_SIZE.
+        """
+        file_extension, content_type = sniff_image(fileobj)
+
+        digest = hashlib.sha256()
+        reader = SizeLimitedReader(fileobj, MAX_IMAGE_SIZE)
+        for chunk in iter(lambda: reader.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        fileobj.seek(0)
+
+        return f"{CONTENT_ADDRESSED_PREFIX}{digest.hexdigest()}.{file_extension}", content_type
+
+    def upload_image_stream(self, fileobj: BinaryIO, filename: str, content_type: str) -> str:
+        """
+        Upload from an open file in chunks (multipart above
+        S3_MULTIPART_THRESHOLD) and return the public URL. Raises ValueError
+        once more than MAX_IMAGE_SIZE bytes have been read.
+        """
+        try:
+            self.s3_client.upload_fileobj(
+                SizeLimitedReader(fileobj, MAX_IMAGE_SIZE),
+                self.bucket_name,
+                filename,
+                ExtraArgs={'ContentType': content_type, 'ACL': 'public-read'},
+                Config=self._transfer_config
+            )
+            return self.public_url(filename)
+        except ClientError as e:
+            raise Exception(f"Failed to upload image: {str(e)}")
 
     def upload_image(self, file_content: bytes, filename: str, file_extension: str) -> str:
         try:
@@ -58,23 +225,197 @@ class S3Service:
             )
 
             # Return public URL
-            return f"https://{self.bucket_name}.s3.{os.getenv('AWS_REGION', 'us-east-1')}.amazonaws.com/{filename}"
+            return self.public_url(filename)
         except ClientError as e:
             raise Exception(f"Failed to upload image: {str(e)}")
+
+    def public_url(self, key: str) -> str:
+        if S3_ENDPOINT_URL:
+            return f"{S3_ENDPOINT_URL.rstrip('/')}/{self.bucket_name}/{key}"
+        return f"https://{self.bucket_name}.s3.{os.getenv('AWS_REGION', 'us-east-1')}.amazonaws.com/{key}"
+
+    def key_from_url(self, image_url: str) -> Optional[str]:
+        """Key of a public URL in this bucket, None for anything else (e.g. a Google profile picture)"""
+        match = re.search(self.url_key_pattern(), image_url)
+        return match.group(1) if match else None
+
+    def url_key_pattern(self) -> str:
+        """Postgres regex whose capture group is the key of a public URL, matching what key_from_url accepts"""
+        if S3_ENDPOINT_URL:
+            return '^' + re.escape(f"{S3_ENDPOINT_URL.rstrip('/')}/{self.bucket_name}/") + '(.*)$'
+        # Anchored on the whole host, so neither "evil-<bucket>.s3..." nor a bucket
+        # whose name merely starts with ours ("<bucket>.s3.x") counts as ours
+        region = re.escape(os.getenv('AWS_REGION', 'us-east-1'))
+        return '^https://' + re.escape(self.bucket_name) + rf'\.s3(?:\.{region})?\.amazonaws\.com/(.*)$'
+
+    @staticmethod
+    def listing_upload_prefix(seller_id: str) -> str:
+        return f"listings/{seller_id}/"
+
+    @staticmethod
+    def profile_picture_prefix(user_id: str) -> str:
+        return f"profilepics/{user_id}/"
+
+    def create_upload_intent(self, key_prefix: str, file_extension: str) -> dict:
+        """
+        Presigned POST for uploading one image straight to the bucket. S3
+        enforces the key, content type, public-read ACL and MAX_IMAGE_SIZE,
+        so the API never handles the bytes.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_id = str(uuid.uuid4())[:8]
+        key = f"{key_prefix}{timestamp}_{unique_id}.{file_extension}"
+        content_type = f'image/{file_extension}'
+
+        post = self.s3_client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=key,
+            Fields={'acl': 'public-read', 'Content-Type': content_type},
+            Conditions=[
+                {'acl': 'public-read'},
+                {'Content-Type': content_type},
+                ['content-length-range', 1, MAX_IMAGE_SIZE]
+            ],
+            ExpiresIn=UPLOAD_INTENT_TTL
+        )
+        return {"key": key, "url": post['url'], "fields": post['fields'], "expires_in": UPLOAD_INTENT_TTL}
+
+    def verify_upload(self, key: str, key_prefix: str) -> str:
+        """
+        Check an object uploaded through an intent by fetching just its
+        leading bytes, and return its public URL. Raises ValueError if the key
+        isn't the caller's, wasn't uploaded or isn't an acceptable image.
+        """
+        file_extension = key.rsplit('.', 1)[-1].lower()
+        if not key.startswith(key_prefix) or '..' in key or file_extension not in ALLOWED_IMAGE_EXTENSIONS:
+            raise ValueError(f"Invalid upload key: {key}")
+
+        not_an_image = ValueError(f"Upload is not an image of at most {MAX_IMAGE_SIZE // (1024 * 1024)}MB: {key}")
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=key, Range=f'bytes=0-{IMAGE_HEADER_SIZE - 1}'
+            )
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code in ('404', 'NoSuchKey', 'NotFound'):
+                raise ValueError(f"Upload not found: {key}")
+            if code == 'InvalidRange':  # an empty object
+                raise not_an_image
+            raise Exception(f"Failed to check upload: {str(e)}")
+        header = response['Body'].read()
+
+        # A ranged GET reports the object's full size after the slash: "bytes 0-11/48213"
+        content_range = response.get('ContentRange')
+        size = int(content_range.rsplit('/', 1)[1]) if content_range else response['ContentLength']
+
+        # The content type is whatever the client posted, so the bytes are checked too
+        if (size > MAX_IMAGE_SIZE or not response.get('ContentType', '').startswith('image/')
+                or detect_image_type(header) is None):
+            raise not_an_image
+        if response['LastModified'] < datetime.now(timezone.utc) - timedelta(seconds=UPLOAD_MAX_AGE):
+            raise ValueError(f"Upload has expired: {key}")
+
+        return self.public_url(key)
     
+    def download_image(self, image_url: str) -> bytes:
+        key = self.key_from_url(image_url)
+        if key is None:
+            raise ValueError(f"Not an image in this bucket: {image_url}")
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        return response['Body'].read()
+
+    def object_exists(self, key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def image_keys(self, image_url: str) -> List[str]:
+        """Keys of an image and its generated variants; none for URLs outside the bucket"""
+        key = self.key_from_url(image_url)
+        return object_keys(key) if key else []
+
     def delete_image(self, image_url: str) -> bool:
         """
-        Delete images from S3 given their URLs
+        Delete images from S3 given their URLs, along with their generated variants
         """
         try:
-            # Extract key from URL
-            key = image_url.split(f'{self.bucket_name}.s3')[1].split('.amazonaws.com/')[1]
-            self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
-            return True
+            return not self.delete_keys(self.image_keys(image_url))
         except ClientError as e:
             print(f"Error deleting image: {str(e)}")
             return False
 
+    def delete_keys(self, keys: List[str]) -> Dict[str, str]:
+        """
+        Delete up to DELETE_OBJECTS_LIMIT keys in one DeleteObjects call.
+        Returns the keys S3 failed to delete, with its error message.
+        """
+        response = self.s3_client.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+        )
+        return {error['Key']: error.get('Message') or error.get('Code', '') for error in response.get('Errors', [])}
+
+    async def upload_image_async(self, file_content: bytes, filename: str, file_extension: str) -> str:
+        return await self._run(self.upload_image, file_content, filename, file_extension)
+
+    async def download_image_async(self, image_url: str) -> bytes:
+        return await self._run(self.download_image, image_url)
+
+    async def object_exists_async(self, key: str) -> bool:
+        return await self._run(self.object_exists, key)
+
+    async def upload_profile_picture_async(self, fileobj: BinaryIO, user_id: str) -> str:
+        return await self._run(self.upload_profile_picture, fileobj, user_id)
+
+    async def upload_listing_image_async(self, fileobj: BinaryIO, listing_id: str) -> str:
+        return await self._run(self.upload_listing_image, fileobj, listing_id)
+
+    async def upload_listing_images(self, files: List[BinaryIO], listing_id: str) -> List[str]:
+        """
+        Stream open image files concurrently and return their URLs in order.
+        If any upload fails, the ones that succeeded are deleted and the
+        first error is raised.
+        """
+        results = await asyncio.gather(
+            *(self.upload_listing_image_async(fileobj, listing_id) for fileobj in files),
+            return_exceptions=True
+        )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            uploaded = [result for result in results if not isinstance(result, BaseException)]
+            await self.delete_images_async(uploaded)
+            raise errors[0]
+
+        return results
+
+    async def content_addressed_key_async(self, fileobj: BinaryIO) -> Tuple[str, str]:
+        return await self._run(self.content_addressed_key, fileobj)
+
+    async def upload_image_stream_async(self, fileobj: BinaryIO, filename: str, content_type: str) -> str:
+        return await self._run(self.upload_image_stream, fileobj, filename, content_type)
+
+    async def upload_image_streams(self, uploads: List[Tuple[BinaryIO, str, str]]) -> List[str]:
+        """upload_image_stream for several (file, key, content type) uploads at once"""
+        return await asyncio.gather(*(self.upload_image_stream_async(*upload) for upload in uploads))
+
+    async def verify_upload_async(self, key: str, key_prefix: str) -> str:
+        return await self._run(self.verify_upload, key, key_prefix)
+
+    async def verify_uploads(self, keys: List[str], key_prefix: str) -> List[str]:
+        """verify_upload for several keys at once; returns their URLs in order"""
+        return await asyncio.gather(*(self.verify_upload_async(key, key_prefix) for key in keys))
+
+    async def delete_image_async(self, image_url: str) -> bool:
+        return await self._run(self.delete_image, image_url)
+
+    async def delete_images_async(self, image_urls: List[str]) -> List[bool]:
+        return await asyncio.gather(*(self.delete_image_async(url) for url in image_urls))
+
 # Create global instance with lazy initialization
 s3_service = None
 
@@ -0,0 +1,230 @@
+import asyncio
+import heapq
+import math
+import os
+import re
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models import Listings
+
+load_dotenv()
+
+_token_pattern = re.compile(r"\w+", re.UNICODE)
+
+# Term frequencies are weighted per field before BM25 saturation (BM25F style),
+# so a word in the title counts for more than the same word in the description
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'tags': 2.0,
+    'description': 1.0,
+}
+
+REBUILD_BATCH_SIZE = 5000
+
+# Seconds between full rebuilds from the listings table. Each API worker holds
+# its own index, kept current only by writes made through that worker; the
+# rebuild is what brings in listings created or deleted anywhere else.
+SEARCH_INDEX_REBUILD_INTERVAL = float(os.getenv("SEARCH_INDEX_REBUILD_INTERVAL", "300"))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return _token_pattern.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    In-process inverted index over listing title, description and tags with
+    BM25 scoring. Built in bulk from the listings table at startup, kept
+    current by create_listing/delete_listing on this process and rebuilt every
+    SEARCH_INDEX_REBUILD_INTERVAL seconds. With several workers (or writes
+    from migrations and scripts) results can lag the database by up to that
+    interval, and every worker pays for its own copy in memory.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # Listings are numbered internally: int keys hash in C, where UUID.__hash__
+        # runs in Python for every posting a query touches. Numbers aren't
+        # reused; a rebuild renumbers everything.
+        self._doc_numbers: Dict[uuid.UUID, int] = {}
+        self._listing_ids: List[Optional[uuid.UUID]] = []
+        self._doc_lengths: List[float] = []
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._total_length = 0.0
+        # Writes made while a rebuild is reading the table, replayed onto its result
+        self._journal: Optional[List[Tuple[uuid.UUID, Optional[Dict[str, float]]]]] = None
+
+    def __len__(self):
+        return len(self._doc_numbers)
+
+    @staticmethod
+    def _weighted_terms(title: Optional[str], description: Optional[str],
+                        tags: Optional[Iterable[str]]) -> Dict[str, float]:
+        fields = {
+            'title': tokenize(title),
+            'description': tokenize(description),
+            'tags': [token for tag in (tags or []) for token in tokenize(tag)],
+        }
+        terms: Dict[str, float] = defaultdict(float)
+        for field, tokens in fields.items():
+            for token in tokens:
+                terms[token] += FIELD_WEIGHTS[field]
+        return terms
+
+    def _add_unlocked(self, listing_id: uuid.UUID, terms: Dict[str, float]):
+        self._remove_unlocked(listing_id)
+        doc = len(self._listing_ids)
+        for term, frequency in terms.items():
+            self._postings[term][doc] = frequency
+        length = sum(terms.values())
+        self._doc_numbers[listing_id] = doc
+        self._listing_ids.append(listing_id)
+        self._doc_lengths.append(length)
+        self._doc_terms[doc] = terms
+        self._total_length += length
+
+    def _remove_unlocked(self, listing_id: uuid.UUID):
+        doc = self._doc_numbers.pop(listing_id, None)
+        if doc is None:
+            return
+        for term in self._doc_terms.pop(doc):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths[doc]
+        self._listing_ids[doc] = None
+        self._doc_lengths[doc] = 0.0
+
+    def add(self, listing_id: uuid.UUID, title: Optional[str], description: Optional[str],
+            tags: Optional[Iterable[str]] = None):
+        """Index a listing, replacing any previous entry for the same id"""
+        terms = self._weighted_terms(title, description, tags)
+        with self._lock:
+            self._add_unlocked(listing_id, terms)
+            if self._journal is not None:
+                self._journal.append((listing_id, terms))
+
+    def add_listing(self, listing: Listings):
+        self.add(listing.id, listing.title, listing.description, listing.tags)
+
+    def remove(self, listing_id: uuid.UUID):
+        with self._lock:
+            self._remove_unlocked(listing_id)
+            if self._journal is not None:
+                self._journal.append((listing_id, None))
+
+    def rebuild(self, db: Session):
+        """Replace the index contents with every row of the listings table"""
+        rows = (
+            db.query(Listings.id, Listings.title, Listings.description, Listings.tags)
+            .execution_options(yield_per=REBUILD_BATCH_SIZE)
+        )
+        with self._lock:
+            self._journal = []
+        fresh = SearchIndex(self.k1, self.b)
+        try:
+            for row in rows:
+                fresh._add_unlocked(row.id, self._weighted_terms(row.title, row.description, row.tags))
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+
+        with self._lock:
+            for listing_id, terms in self._journal:
+                if terms is None:
+                    fresh._remove_unlocked(listing_id)
+                else:
+                    fresh._add_unlocked(listing_id, terms)
+            self._journal = None
+            self._doc_numbers = fresh._doc_numbers
+            self._listing_ids = fresh._listing_ids
+            self._doc_lengths = fresh._doc_lengths
+            self._doc_terms = fresh._doc_terms
+            self._postings = fresh._postings
+            self._total_length = fresh._total_length
+
+    def search(self, q: str, limit: Optional[int] = None,
+               after: Optional[Tuple[float, uuid.UUID]] = None) -> List[Tuple[uuid.UUID, float]]:
+        """
+        Score every listing containing at least one query term and return
+        (listing_id, score) pairs, best first with ties broken by id. `after`
+        skips everything up to and including that (score, id); `limit` keeps
+        only the best that many without sorting the rest.
+        """
+        query_terms = set(tokenize(q))
+        if not query_terms:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        with self._lock:
+            doc_count = len(self._doc_numbers)
+            if not doc_count:
+                return []
+            # BM25 length normalization, k1 * (1 - b + b * length / average), as norm_base + norm_per_length * length
+            norm_base = self.k1 * (1 - self.b)
+            norm_per_length = self.k1 * self.b / (self._total_length / doc_count)
+            doc_lengths = self._doc_lengths
+
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc, frequency in postings.items():
+                    norm = norm_base + norm_per_length * doc_lengths[doc]
+                    scores[doc] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            # (-score, id as an int, doc) sorts best first with ties broken by id,
+            # the same order as the id strings, comparing only in C
+            listing_ids = self._listing_ids
+            candidates = [(-score, listing_ids[doc].int, doc) for doc, score in scores.items()]
+
+        if after is not None:
+            after_key = (-after[0], after[1].int)
+            candidates = [candidate for candidate in candidates if candidate[:2] > after_key]
+        if limit:
+            candidates = heapq.nsmallest(limit, candidates)
+        else:
+            candidates.sort()
+        return [(listing_ids[doc], -negative_score) for negative_score, _, doc in candidates]
+
+    async def run_periodic_rebuild(self, interval: float = SEARCH_INDEX_REBUILD_INTERVAL):
+        """Rebuild from the database on a timer until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self._rebuild_in_session)
+            except Exception as e:
+                print(f"Error rebuilding search index: {str(e)}")
+
+    def _rebuild_in_session(self):
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        finally:
+            db.close()
+
+
+# Create global instance with lazy initialization
+search_index = None
+
+def get_search_index():
+    global search_index
+    if search_index is None:
+        search_index = SearchIndex()
+    return search_index
@@ -0,0 +1,106 @@
+import os
+import re
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Query, with_expression
+
+from models import Listings
+from services.pagination import clamp_page_size, decode_cursor, encode_cursor
+from services.search_index import get_search_index
+
+load_dotenv()
+
+# Which engine answers /listings/search:
+#   ilike  - substring match on title/description, newest first (default)
+#   fts    - Postgres full-text search over listings.search_vector, ranked
+#   memory - in-process BM25 inverted index (services.search_index), ranked;
+#            one copy per worker, refreshed every SEARCH_INDEX_REBUILD_INTERVAL
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "ilike").lower()
+
+# How many ranked candidates are checked against the SQL filters per query,
+# and how many such batches one page may check before it is returned short
+MEMORY_CANDIDATE_BATCH = 200
+MEMORY_MAX_CANDIDATE_BATCHES = 5
+
+TS_CONFIG = 'english'
+
+_token_pattern = re.compile(r"\w+", re.UNICODE)
+
+
+def to_prefix_tsquery(q: str) -> Optional[str]:
+    """
+    Turn free text into a to_tsquery() expression that ANDs every word and
+    prefix-matches the last one, so results update while the user is still
+    typing ("red bik" matches "red bike"). Returns None if q has no words.
+    """
+    tokens = _token_pattern.findall(q.lower())
+    if not tokens:
+        return None
+
+    tokens[-1] = f"{tokens[-1]}:*"
+    return " & ".join(tokens)
+
+
+def full_text_search(query: Query, q: str):
+    """
+    Restrict a listings query to rows matching q and load each row's score
+    into Listings.search_rank. Title matches are weighted above description
+    and tag matches (see the listings_search_vector migration). Returns
+    (query, rank) or (None, None) when q has nothing searchable in it.
+    """
+    expression = to_prefix_tsquery(q)
+    if expression is None:
+        return None, None
+
+    tsquery = func.to_tsquery(TS_CONFIG, expression)
+    rank = func.ts_rank(Listings.search_vector, tsquery)
+
+    query = (
+        query
+        .filter(Listings.search_vector.op('@@')(tsquery))
+        .options(with_expression(Listings.search_rank, rank))
+    )
+    return query, rank
+
+
+def memory_search_page(query: Query, q: str, limit: Optional[int], cursor: Optional[str]):
+    """
+    Rank listings with the in-memory index, then keep the ones that pass the
+    feed filters already applied to `query`. Candidates are checked in ranked
+    batches by primary key until a page is filled, at most
+    MEMORY_MAX_CANDIDATE_BATCHES per page; when selective filters use them all
+    up, the page comes back short and its cursor resumes after the last
+    candidate checked. The cursor holds a (score, id) in ranked order.
+    """
+    limit = clamp_page_size(limit)
+    after = tuple(decode_cursor(cursor, [float, uuid.UUID])) if cursor else None
+    max_candidates = MEMORY_CANDIDATE_BATCH * MEMORY_MAX_CANDIDATE_BATCHES
+    ranked = get_search_index().search(q, limit=max_candidates, after=after)
+
+    page = []
+    checked = 0
+    for start in range(0, len(ranked), MEMORY_CANDIDATE_BATCH):
+        batch = ranked[start:start + MEMORY_CANDIDATE_BATCH]
+        found = {
+            listing.id: listing
+            for listing in query.filter(Listings.id.in_([listing_id for listing_id, _ in batch]))
+        }
+        page.extend((found[listing_id], score) for listing_id, score in batch if listing_id in found)
+        checked = start + len(batch)
+        if len(page) > limit:
+            break
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last_listing, last_score = page[-1]
+        next_cursor = encode_cursor((last_score, last_listing.id))
+    elif checked == max_candidates:
+        # More candidates may remain past the ones this page could check
+        last_id, last_score = ranked[-1]
+        next_cursor = encode_cursor((last_score, last_id))
+
+    return [listing for listing, _ in page], next_cursor
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Integer, Uuid, column, func, update, values
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from models import Listings
+
+load_dotenv()
+
+# Seconds between batched writes of accumulated views
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))
+
+# Listings whose seller and view count are kept in memory
+VIEW_CACHE_SIZE = int(os.getenv("VIEW_CACHE_SIZE", "50000"))
+
+
+class ViewCounter:
+    """
+    Write-behind aggregator for listing views. Views are counted in memory
+    per listing and written by flush() as one
+    UPDATE ... SET views = views + delta for the whole batch, so a page view
+    costs no database round trip once the listing has been seen and
+    concurrent views are never lost to read-modify-write races.
+    """
+
+    def __init__(self, max_listings: int = VIEW_CACHE_SIZE):
+        self.max_listings = max_listings
+        self._lock = threading.Lock()
+        # listing id -> (seller id, views as of the last read or flush)
+        self._listings: "OrderedDict[uuid.UUID, Tuple[Optional[uuid.UUID], int]]" = OrderedDict()
+        self._pending: Dict[uuid.UUID, int] = {}
+        # Views taken by a flush that hasn't committed yet
+        self._in_flight: Dict[uuid.UUID, int] = {}
+        # One flush at a time: a cancelled periodic flush keeps running in its
+        # thread, and the shutdown flush must not replace its _in_flight
+        self._flush_lock = threading.Lock()
+
+    def lookup(self, listing_id: uuid.UUID, db: Session) -> Optional[Tuple[Optional[uuid.UUID], int]]:
+        """(seller_id, current views) for a listing, or None if it doesn't exist"""
+        with self._lock:
+            known = self._listings.get(listing_id)
+            if known is not None:
+                self._listings.move_to_end(listing_id)
+                return known[0], known[1] + self._unflushed(listing_id)
+
+        row = db.query(Listings.seller_id, Listings.views).filter(Listings.id == listing_id).first()
+        if row is None:
+            return None
+
+        with self._lock:
+            self._remember(listing_id, row.seller_id, row.views or 0)
+            return row.seller_id, (row.views or 0) + self._unflushed(listing_id)
+
+    def _unflushed(self, listing_id: uuid.UUID) -> int:
+        return self._pending.get(listing_id, 0) + self._in_flight.get(listing_id, 0)
+
+    def _remember(self, listing_id: uuid.UUID, seller_id: Optional[uuid.UUID], views: int):
+        self._listings[listing_id] = (seller_id, views)
+        self._listings.move_to_end(listing_id)
+        # Evicted listings still have their pending views flushed
+        while len(self._listings) > self.max_listings:
+            self._listings.popitem(last=False)
+
+    def record(self, listing_id: uuid.UUID) -> int:
+        """Count one view and return the listing's view total"""
+        with self._lock:
+            self._pending[listing_id] = self._pending.get(listing_id, 0) + 1
+            known = self._listings.get(listing_id)
+            base = known[1] if known is not None else 0
+            return base + self._unflushed(listing_id)
+
+    def forget(self, listing_id: uuid.UUID):
+        with self._lock:
+            self._listings.pop(listing_id, None)
+            self._pending.pop(listing_id, None)
+
+    def flush(self) -> int:
+        """Write all pending views in one statement; returns how many listings were updated"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._in_flight = pending
+        if not pending:
+            return 0
+
+        deltas = values(column('id', Uuid), column('delta', Integer), name='deltas').data(list(pending.items()))
+        statement = (
+            update(Listings)
+            .where(Listings.id == deltas.c.id)
+            .values(views=func.coalesce(Listings.views, 0) + deltas.c.delta)
+            .returning(Listings.id, Listings.views)
+        )
+
+        db = SessionLocal()
+        try:
+            rows = db.execute(statement).all()
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the views back so the next flush retries them
+            with self._lock:
+                for listing_id, delta in pending.items():
+                    self._pending[listing_id] = self._pending.get(listing_id, 0) + delta
+                self._in_flight = {}
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            for listing_id, views in rows:
+                known = self._listings.get(listing_id)
+                if known is not None:
+                    self._listings[listing_id] = (known[0], views)
+            self._in_flight = {}
+        return len(rows)
+
+    async def run_periodic_flush(self, interval: float = VIEW_FLUSH_INTERVAL):
+        """Flush on a timer until cancelled; the caller flushes once more on shutdown"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Error flushing listing views: {str(e)}")
+
+
+# Create global instance with lazy initialization
+view_counter = None
+
+def get_view_counter():
+    global view_counter
+    if view_counter is None:
+        view_counter = ViewCounter()
+    return view_counter
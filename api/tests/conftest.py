@@ -0,0 +1,125 @@
+"""
+Shared fixtures. Run from the api directory:
+
+    python -m pytest tests
+
+Tests that need Postgres use the `db` fixture and are skipped unless
+TEST_DATABASE_URL points at a scratch database (its tables are created and
+dropped by the fixture, so don't point it at real data). The database needs
+the PostGIS extension available for the listings.geog column.
+"""
+import os
+import sys
+import uuid
+from urllib.parse import urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+# db.database builds its engine from these at import time
+if TEST_DATABASE_URL:
+    _url = urlparse(TEST_DATABASE_URL)
+    os.environ.update(DB_HOST=_url.hostname or 'localhost', DB_PORT=str(_url.port or 5432),
+                      DB_NAME=_url.path.lstrip('/'), DB_USER=_url.username or '',
+                      DB_PASSWORD=_url.password or '')
+for _name, _default in (('DB_HOST', 'localhost'), ('DB_PORT', '5432'), ('DB_NAME', 'marketplace'),
+                        ('DB_USER', 'postgres'), ('DB_PASSWORD', '')):
+    os.environ.setdefault(_name, _default)
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'test')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'test')
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+os.environ.setdefault('S3_BUCKET_NAME', 'test-bucket')
+
+
+@pytest.fixture(scope='session')
+def engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from sqlalchemy import create_engine, text
+    from models import Base
+
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS postgis'))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """A session whose work is rolled back after the test"""
+    from sqlalchemy.orm import Session
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode='create_savepoint')
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def count_statements(engine):
+    """Returns a list that collects every SQL statement run while the test executes"""
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def make_user(db):
+    from models import Users
+
+    def make_user(**columns):
+        user = Users(fname=columns.pop('fname', 'Test'), lname=columns.pop('lname', 'User'),
+                     email=columns.pop('email', f'{uuid.uuid4().hex}@example.edu'),
+                     password=columns.pop('password', 'hashed-password'), **columns)
+        db.add(user)
+        db.flush()
+        return user
+
+    return make_user
+
+
+@pytest.fixture
+def make_listing(db):
+    from models import Listings
+
+    def make_listing(seller, **columns):
+        listing = Listings(title=columns.pop('title', 'Desk lamp'), description=columns.pop('description', 'Works'),
+                           price=columns.pop('price', 10), category=columns.pop('category', 'furniture'),
+                           condition=columns.pop('condition', 'used'), seller_id=seller.id, **columns)
+        db.add(listing)
+        db.flush()
+        return listing
+
+    return make_listing
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    """A fresh S3 service pointed at a local FakeS3; set .delay to slow its answers down"""
+    import services.s3_service as s3_module
+    from fake_s3 import FakeS3
+
+    server = FakeS3()
+    monkeypatch.setattr(s3_module, 'S3_ENDPOINT_URL', server.url)
+    service = s3_module.S3Service()
+    monkeypatch.setattr(s3_module, 's3_service', service)
+    yield server
+    service._executor.shutdown(wait=False)
+    server.close()
@@ -0,0 +1,62 @@
+"""
+A minimal S3 stand-in on a local port for tests: accepts object PUTs,
+multipart uploads and deletes, records every request and can be told to
+answer slowly to stand in for a distant bucket.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _receive(self, method):
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.server.requests.append((method, self.path, len(body)))
+        time.sleep(self.server.delay)
+        return body
+
+    def _reply(self, code, body=b'', headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        self._receive('PUT')
+        self._reply(200, headers={'ETag': '"etag"'})
+
+    def do_POST(self):
+        self._receive('POST')
+        if self.path.endswith('?uploads'):
+            self._reply(200, b'<InitiateMultipartUploadResult><UploadId>upload</UploadId>'
+                             b'</InitiateMultipartUploadResult>')
+        else:
+            self._reply(200, b'<CompleteMultipartUploadResult><ETag>"etag"</ETag></CompleteMultipartUploadResult>')
+
+    def do_DELETE(self):
+        self._receive('DELETE')
+        self._reply(204)
+
+
+class FakeS3:
+    def __init__(self, delay: float = 0.0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeS3Handler)
+        self.server.requests = []
+        self.server.delay = delay
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,55 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db.database import get_db
+from main import app
+from routers import listings as listings_router
+from routers.listings import BATCH_MAX_IDS
+
+
+class FakeQuery:
+    """feed_query(db) returning fixed listings, whatever the filter"""
+
+    def __init__(self, listings):
+        self.listings = listings
+
+    def filter(self, *criteria):
+        return self
+
+    def options(self, *options):
+        return self
+
+    def __iter__(self):
+        return iter(self.listings)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stored = SimpleNamespace(id=uuid.uuid4(), seller=None)
+    monkeypatch.setattr(listings_router, 'feed_query', lambda db: FakeQuery([stored]))
+    monkeypatch.setattr(listings_router, 'format_listing',
+                        lambda listing, seller, projection=None: {"id": str(listing.id)})
+    app.dependency_overrides[get_db] = lambda: None
+    yield SimpleNamespace(client=TestClient(app), stored=stored)
+    app.dependency_overrides.clear()
+
+
+def test_batch_limit_counts_ids_as_sent(client):
+    listing_id = str(client.stored.id)
+    response = client.client.post('/listings/batch', json={"ids": [listing_id] * (BATCH_MAX_IDS + 1)})
+    assert response.status_code == 400
+
+
+def test_batch_is_keyed_by_the_ids_as_sent(client):
+    lower = str(client.stored.id)
+    upper = lower.upper()
+    response = client.client.post('/listings/batch', json={"ids": [upper, lower, upper, "not-an-id"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["listings"]) == {upper, lower}
+    assert body["listings"][upper] == {"id": lower}
+    assert body["missing"] == ["not-an-id"]
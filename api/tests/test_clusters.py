@@ -0,0 +1,118 @@
+import datetime
+import uuid
+
+from sqlalchemy.dialects import postgresql
+
+import services.cluster_service as cluster_service
+from models import Listings
+from services.cluster_service import (CLUSTER_MAX_ZOOM, MAX_ZOOM, MILES_PER_DEGREE_LATITUDE, Cell, ClusterCache,
+                                      aggregate_cells, cell_of, cell_size, fit_zoom)
+from services.location_service import DISPLAY_OFFSET_MAX_MILES, display_coords
+
+
+def test_cluster_zoom_is_capped_at_the_display_offset():
+    assert cell_size(CLUSTER_MAX_ZOOM) * MILES_PER_DEGREE_LATITUDE >= DISPLAY_OFFSET_MAX_MILES
+    assert cell_size(CLUSTER_MAX_ZOOM + 1) * MILES_PER_DEGREE_LATITUDE < DISPLAY_OFFSET_MAX_MILES
+    assert fit_zoom(MAX_ZOOM, 40.70, -74.01, 40.71, -74.00) == CLUSTER_MAX_ZOOM
+
+
+def test_viewport_aggregation_reads_only_display_coordinates():
+    statements = []
+
+    class Recorder:
+        """Stands in for a Query, keeping the filter and select clauses"""
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: self
+
+        def filter(self, *criteria):
+            statements.extend(criteria)
+            return self
+
+        def with_entities(self, *entities):
+            statements.extend(entities)
+            return self
+
+        def all(self):
+            return []
+
+    aggregate_cells(Recorder(), 10, 40.0, -75.0, 41.0, -73.0)
+    sql = ' '.join(str(clause.compile(dialect=postgresql.dialect())) for clause in statements)
+    assert 'display_latitude' in sql and 'display_longitude' in sql
+    assert 'listings.latitude' not in sql and 'listings.longitude' not in sql
+
+
+def test_cached_cells_track_display_coordinates():
+    cache = ClusterCache()
+    cache._levels[CLUSTER_MAX_ZOOM] = {}
+    listing_id = uuid.uuid4()
+    display_latitude, display_longitude = display_coords(listing_id, 40.7128, -74.0060)
+
+    cache.add(listing_id, display_latitude, display_longitude)
+    (key, cell), = cache._levels[CLUSTER_MAX_ZOOM].items()
+    cluster = cell.as_cluster(key)
+    assert (cluster["latitude"], cluster["longitude"]) == (float(display_latitude), float(display_longitude))
+
+    cache.remove(listing_id, display_latitude, display_longitude)
+    assert cache._levels[CLUSTER_MAX_ZOOM] == {}
+
+
+def test_aggregate_cells_centroids_are_display_locations(db, make_user, make_listing):
+    seller = make_user()
+    listing_id = uuid.uuid4()
+    display_latitude, display_longitude = display_coords(listing_id, 40.7128, -74.0060)
+    make_listing(seller, id=listing_id, latitude=40.7128, longitude=-74.0060,
+                 display_latitude=display_latitude, display_longitude=display_longitude)
+
+    cells = aggregate_cells(db.query(Listings), CLUSTER_MAX_ZOOM, 40.6, -74.1, 40.8, -73.9)
+    (key, cell), = cells.items()
+    cluster = cell.as_cluster(key)
+    assert abs(cluster["latitude"] - float(display_latitude)) < 1e-6
+    assert abs(cluster["longitude"] - float(display_longitude)) < 1e-6
+
+
+def test_cached_levels_are_rebuilt_after_the_ttl(monkeypatch):
+    builds = []
+
+    def aggregate(query, zoom):
+        builds.append(zoom)
+        return {(0, 0): Cell(len(builds), 0.0, 0.0, uuid.uuid4())}
+
+    monkeypatch.setattr(cluster_service, 'aggregate_cells', aggregate)
+    db = type('FakeSession', (), {'query': lambda self, *entities: None})()
+    now = [1000.0]
+    monkeypatch.setattr(cluster_service.time, 'monotonic', lambda: now[0])
+    cache = ClusterCache(ttl=60)
+
+    assert cache.cells(db, 3, 0.1, 0.1, 0.2, 0.2)[(0, 0)].count == 1
+    now[0] += 59
+    assert cache.cells(db, 3, 0.1, 0.1, 0.2, 0.2)[(0, 0)].count == 1
+    # Listings written by other processes show up once the level expires
+    now[0] += 2
+    assert cache.cells(db, 3, 0.1, 0.1, 0.2, 0.2)[(0, 0)].count == 2
+    assert builds == [3, 3]
+
+
+def test_cached_cells_leave_out_the_askers_listings(db, make_user, make_listing):
+    asker, other = make_user(), make_user()
+    created_at = datetime.datetime(2026, 1, 1)
+    theirs = make_listing(other, display_latitude=40.7128, display_longitude=-74.0060, created_at=created_at)
+    mine = make_listing(asker, display_latitude=40.7130, display_longitude=-74.0061,
+                        created_at=created_at.replace(day=2))
+    only_mine = make_listing(asker, display_latitude=41.5, display_longitude=-74.5)
+
+    cache = ClusterCache()
+    viewport = (CLUSTER_MAX_ZOOM - 4, 40.0, -75.0, 42.0, -73.0)
+    shared = cache.cells(db, *viewport)
+    key = cell_of(40.7128, -74.0060, viewport[0])
+    assert shared[key].count == 2 and shared[key].representative_id == mine.id
+
+    visible = cache.cells(db, *viewport, exclude_seller=str(asker.id))
+    assert visible[key].count == 1
+    assert visible[key].representative_id == theirs.id
+    assert abs(visible[key].as_cluster(key)["latitude"] - 40.7128) < 1e-6
+    assert cell_of(41.5, -74.5, viewport[0]) not in visible
+
+    # The shared cells are untouched
+    assert cache.cells(db, *viewport)[key].representative_id == mine.id
+    assert only_mine.id not in {cell.representative_id for cell in visible.values()}
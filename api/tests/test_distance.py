@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from models import Listings
+from routers import listings as listings_router
+from routers.listings import filter_by_location
+from services.feed_cache import FeedScope
+from services.location_service import DISPLAY_OFFSET_MAX_MILES, display_coords, distance_miles
+
+CENTER = (40.7128, -74.0060)
+
+
+def compiled(query):
+    return str(query.statement.compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.parametrize('backend', ['bbox', 'postgis'])
+def test_radius_queries_measure_to_display_locations(backend, monkeypatch):
+    monkeypatch.setattr(listings_router, 'SPATIAL_BACKEND', backend)
+    sql = compiled(filter_by_location(Session().query(Listings), *CENTER, 3))
+
+    where = sql.split('WHERE', 1)[1]
+    assert 'listings.display_latitude' in where
+    assert 'listings.latitude' not in where and 'listings.longitude' not in where
+    assert '<->' not in sql
+
+
+def test_invalidation_covers_listings_displayed_inside_the_radius():
+    scope = FeedScope.for_filters(None, None, *CENTER, 3)
+    # Real spot just outside the radius, display location just inside it
+    real = (CENTER[0] + (3 + DISPLAY_OFFSET_MAX_MILES * 0.9) / 69.09, CENTER[1])
+    assert scope.covers(None, None, *real)
+
+
+def test_dist_away_is_measured_to_the_display_location(db, make_user, make_listing):
+    seller = make_user()
+    listing = make_listing(seller, latitude=CENTER[0] + 1 / 69.09, longitude=CENTER[1])
+    listing.display_latitude, listing.display_longitude = display_coords(listing.id, listing.latitude,
+                                                                          listing.longitude)
+    db.flush()
+    db.expire_all()
+
+    found = filter_by_location(db.query(Listings), *CENTER, 5).one()
+    expected = distance_miles(*CENTER, found.display_latitude, found.display_longitude)
+    assert found.dist_away == pytest.approx(expected, abs=1e-6)
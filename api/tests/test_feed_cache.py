@@ -0,0 +1,64 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from routers import listings as listings_router
+from services.feed_cache import FeedCache
+from services.responses import ListingItem
+
+CENTER = (40.7128, -74.0060)
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """cached_feed_page over a fixed page of listings, recording the filters each load used"""
+    cache = FeedCache(max_entries=16, ttl=60)
+    monkeypatch.setattr(listings_router, 'get_feed_cache', lambda: cache)
+    monkeypatch.setattr(listings_router, 'feed_query', lambda db: None)
+    monkeypatch.setattr(listings_router, 'apply_filters',
+                        lambda user_id, query, lat, lon, dist, *args, **kwargs: (user_id, lat, lon, dist))
+
+    seller = SimpleNamespace(id=uuid.uuid4())
+    items = [ListingItem(listing={"id": str(i)}, seller=seller, dist_away=float(i)) for i in range(3)]
+    loads = []
+
+    def load_page(filters, lat, lon, **page_args):
+        loads.append(filters)
+        return {"listings": list(items), "next_cursor": "next"}
+
+    def page(lat, lon, dist, user_id=None, sort=None):
+        return listings_router.cached_feed_page(load_page, None, user_id, lat, lon, dist, False, None, None,
+                                                limit=3, cursor=None, sort=sort)
+
+    return SimpleNamespace(page=page, loads=loads, items=items)
+
+
+def test_radius_pages_are_cached_for_their_exact_circle(feed):
+    page = feed.page(*CENTER, 3)
+    assert page["listings"] == feed.items
+    assert page["next_cursor"] == "next"
+    assert feed.loads == [(None, *CENTER, 3)]
+
+    feed.page(*CENTER, 3)
+    assert len(feed.loads) == 1
+
+    # A nearby center or a different radius loads its own page rather than trimming a shared one
+    feed.page(CENTER[0] + 0.001, CENTER[1], 3)
+    feed.page(*CENTER, 4)
+    assert feed.loads[1:] == [(None, CENTER[0] + 0.001, CENTER[1], 3), (None, *CENTER, 4)]
+
+
+def test_pages_are_cached_per_asker(feed):
+    user_id = str(uuid.uuid4())
+    assert feed.page(None, None, None, user_id=user_id.upper())["listings"] == feed.items
+    feed.page(None, None, None, user_id=user_id)
+    feed.page(None, None, None)
+    # The asker's own listings are left out by the query, so each asker gets a full page
+    assert feed.loads == [(user_id.upper(), None, None, None), (None, None, None, None)]
+
+
+def test_nearest_first_pages_are_cached(feed):
+    feed.page(*CENTER, 3, sort='distance')
+    feed.page(*CENTER, 3, sort='distance')
+    assert len(feed.loads) == 1
@@ -0,0 +1,45 @@
+from sqlalchemy.dialects import postgresql
+
+from routers.listings import feed_query, load_feed_page
+from services.projection import parse_projection
+
+
+def compiled(query):
+    return str(query.statement.compile(dialect=postgresql.dialect()))
+
+
+def test_feed_query_selects_only_seller_card_columns():
+    from sqlalchemy.orm import Session
+
+    sql = compiled(feed_query(Session()))
+    select_list = sql.split(' FROM ')[0]
+    for column in ('users.id', 'users.fname', 'users.lname', 'users.email', 'users.pfp_url'):
+        assert column in select_list
+    for column in ('users.password', 'users.google_id', 'users.is_admin', 'users.email_verified'):
+        assert column not in select_list
+
+
+def test_card_view_keeps_seller_columns_out_of_the_select():
+    from sqlalchemy.orm import Session
+
+    query = feed_query(Session()).options(*parse_projection('card', None).load_options())
+    assert 'users.password' not in compiled(query).split(' FROM ')[0]
+
+
+def test_feed_page_is_one_statement_regardless_of_page_size(db, make_user, make_listing, count_statements):
+    sellers = [make_user() for _ in range(5)]
+    for i in range(40):
+        make_listing(sellers[i % len(sellers)])
+    db.expire_all()
+
+    counts = {}
+    for limit in (5, 20, 40):
+        count_statements.clear()
+        page = load_feed_page(feed_query(db), None, None, limit=limit, cursor=None, sort='newest')
+        # keyset_page fetches limit + 1 rows, sellers included, in a single SELECT
+        counts[limit] = len(count_statements)
+        assert len(page['listings']) == limit
+        assert {item.seller.id for item in page['listings']} <= {seller.id for seller in sellers}
+        db.expire_all()
+
+    assert counts[5] == counts[20] == counts[40] == 1
@@ -0,0 +1,69 @@
+import asyncio
+import io
+import os
+import time
+
+import pytest
+
+from services.image_dedup import acquire, acquire_images, content_digest
+from services.s3_service import CONTENT_ADDRESSED_PREFIX, get_s3_service
+
+
+def jpeg(payload: bytes) -> io.BytesIO:
+    return io.BytesIO(b'\xff\xd8\xff\xe0' + payload)
+
+
+def test_content_digest_reads_variant_keys():
+    digest = 'a' * 64
+    assert content_digest(f'{CONTENT_ADDRESSED_PREFIX}{digest}.jpg') == digest
+    assert content_digest(f'{CONTENT_ADDRESSED_PREFIX}{digest}_thumb.webp') == digest
+    assert content_digest('listings/abc/image.jpg') is None
+
+
+@pytest.fixture
+def blobs(engine):
+    from sqlalchemy import text
+
+    yield
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM image_blobs'))
+
+
+def test_waiting_on_a_held_reference_leaves_the_event_loop_running(engine, blobs):
+    """
+    A second upload of content another request holds an uncommitted reference
+    on waits for that request in a worker thread, not on the event loop, so the
+    holder can still finish its upload and commit.
+    """
+    from sqlalchemy.orm import Session
+
+    payload = os.urandom(1024)
+    key, _ = get_s3_service().content_addressed_key(jpeg(payload))
+
+    holder = Session(engine)
+    waiter = Session(engine)
+    try:
+        assert acquire(holder, [key]) == {key}
+
+        async def scenario():
+            waiting = asyncio.create_task(acquire_images(waiter, [jpeg(payload)]))
+
+            # The loop keeps ticking while the waiter is blocked on the row lock
+            started = time.perf_counter()
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+            assert time.perf_counter() - started < 0.5
+            assert not waiting.done()
+
+            await asyncio.to_thread(holder.commit)
+            return await asyncio.wait_for(waiting, timeout=5)
+
+        urls, uploads = asyncio.run(scenario())
+        waiter.commit()
+    finally:
+        holder.close()
+        waiter.close()
+
+    # The holder stored the content, so the waiter only gained a reference
+    assert urls == [get_s3_service().public_url(key)]
+    assert uploads == []
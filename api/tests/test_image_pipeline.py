@@ -0,0 +1,83 @@
+import asyncio
+import io
+import uuid
+
+import pytest
+
+import services.image_pipeline as pipeline_module
+from services.image_pipeline import ImagePipeline, listing_variant_urls
+
+IMAGES = ['https://bucket.s3.us-east-1.amazonaws.com/listings/a/1.jpg',
+          'https://bucket.s3.us-east-1.amazonaws.com/listings/a/2.png']
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """An enabled pipeline whose S3 and database work is recorded instead of done"""
+    pipeline = ImagePipeline()
+    pipeline.enabled = True
+    pipeline.processed = []
+    pipeline.marked = []
+    pipeline.failing = set()
+
+    async def ensure(image_url, new=False):
+        if image_url in pipeline.failing:
+            raise RuntimeError("render failed")
+        pipeline.processed.append((image_url, new))
+
+    monkeypatch.setattr(pipeline, 'ensure', ensure)
+    monkeypatch.setattr(pipeline_module, 'mark_variants_ready', pipeline.marked.append)
+    monkeypatch.setattr(pipeline_module, 'get_image_pipeline', lambda: pipeline)
+    return pipeline
+
+
+def test_variants_are_only_linked_once_ready(pipeline):
+    assert listing_variant_urls(IMAGES, None) is None
+    assert listing_variant_urls(IMAGES, False) is None
+    assert [set(urls) for urls in listing_variant_urls(IMAGES, True)] == [{'thumb', 'medium', 'webp'}] * 2
+
+
+def test_variants_are_not_linked_without_the_pipeline(pipeline):
+    pipeline.enabled = False
+    assert listing_variant_urls(IMAGES, True) is None
+
+
+def test_listing_is_marked_once_every_image_is_processed(pipeline):
+    listing_id = uuid.uuid4()
+    asyncio.run(pipeline.process_listing(listing_id, IMAGES, {IMAGES[0]}))
+    assert pipeline.processed == [(IMAGES[0], True), (IMAGES[1], False)]
+    assert pipeline.marked == [listing_id]
+
+
+def test_listing_stays_unmarked_when_an_image_fails(pipeline):
+    pipeline.failing.add(IMAGES[1])
+    asyncio.run(pipeline.process_listing(uuid.uuid4(), IMAGES, set(IMAGES)))
+    assert pipeline.marked == []
+
+
+def test_render_variants_strips_metadata_and_resizes():
+    Image = pytest.importorskip('PIL.Image')
+    from PIL import ImageCms
+    from services.image_pipeline import VARIANTS, render_variants
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: stored sideways, shown rotated 90 degrees
+    exif[0x010F] = 'PhoneMaker'
+    exif.get_ifd(0x8825).update({1: 'N', 2: (40.0, 42.0, 46.0), 3: 'W', 4: (74.0, 0.0, 21.0)})  # GPS
+    original = io.BytesIO()
+    icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+    Image.new('RGB', (2000, 1000), 'red').save(original, 'JPEG', exif=exif, icc_profile=icc_profile)
+    with Image.open(io.BytesIO(original.getvalue())) as source:
+        assert source.getexif().get_ifd(0x8825)
+
+    variants = render_variants(original.getvalue())
+
+    assert set(variants) == set(VARIANTS)
+    # The orientation is applied, so the sideways 2000x1000 original is shown 1000x2000
+    expected = {'thumb': (160, 320), 'medium': (480, 960), 'webp': (1000, 2000)}
+    for name, data in variants.items():
+        with Image.open(io.BytesIO(data)) as variant:
+            assert variant.format == 'WEBP'
+            assert variant.size == expected[name]
+            assert not variant.getexif()
+            assert not {'exif', 'xmp', 'icc_profile'} & set(variant.info)
@@ -0,0 +1,19 @@
+import datetime
+import uuid
+
+import orjson
+
+from models import Users
+from services.responses import ProfileOut, encode_json
+
+
+def test_profile_keeps_every_column_but_the_password():
+    user = Users(id=uuid.uuid4(), fname='Ada', lname='Lovelace', email='ada@example.edu',
+                 email_domain='example.edu', password='hashed-password',
+                 created_at=datetime.datetime(2026, 1, 1), updated_at=datetime.datetime(2026, 2, 1),
+                 is_admin=False, email_verified=True, google_id=None, pfp_url=['https://example.com/ada.jpg'])
+
+    profile = orjson.loads(encode_json(ProfileOut.from_user(user)))
+    assert list(profile) == [column.key for column in Users.__table__.columns if column.key != 'password']
+    assert profile['is_admin'] is False
+    assert profile['updated_at'] == '2026-02-01T00:00:00'
@@ -0,0 +1,44 @@
+import asyncio
+import io
+import os
+import time
+
+from services.s3_service import get_s3_service
+
+# Each request to the fake bucket takes this long
+S3_LATENCY = 0.2
+UPLOADS = 6
+
+
+def jpeg():
+    return io.BytesIO(b'\xff\xd8\xff\xe0' + os.urandom(64 * 1024))
+
+
+async def max_loop_lag(until: asyncio.Task, interval: float = 0.01) -> float:
+    """Worst delay in waking up from asyncio.sleep(interval) while `until` runs"""
+    worst = 0.0
+    while not until.done():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+def test_event_loop_stays_responsive_during_uploads(fake_s3):
+    fake_s3.server.delay = S3_LATENCY
+
+    async def scenario():
+        started = time.perf_counter()
+        uploads = asyncio.create_task(get_s3_service().upload_listing_images([jpeg() for _ in range(UPLOADS)],
+                                                                            'listing'))
+        lag = await max_loop_lag(uploads)
+        return await uploads, lag, time.perf_counter() - started
+
+    urls, lag, elapsed = asyncio.run(scenario())
+
+    assert len(urls) == UPLOADS
+    assert [method for method, _, _ in fake_s3.requests] == ['PUT'] * UPLOADS
+    # Blocking calls on the loop would stall it for a whole S3 round trip
+    assert lag < S3_LATENCY / 2
+    # and run the uploads one after another
+    assert elapsed < S3_LATENCY * UPLOADS / 2
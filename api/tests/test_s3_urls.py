@@ -0,0 +1,66 @@
+import pytest
+
+import services.s3_service as s3_module
+from services.deletion_queue import enqueue_image_deletions
+from services.s3_service import get_s3_service
+
+GOOGLE_PICTURE = 'https://lh3.googleusercontent.com/a/ACg8ocJ-example=s96-c'
+
+
+class RecordingSession:
+    """Stands in for a Session, keeping the statements instead of running them"""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def s3_service():
+    return get_s3_service()
+
+
+def test_key_from_url_round_trips_public_urls(s3_service):
+    key = 'listings/abc/image.jpg'
+    assert s3_service.key_from_url(s3_service.public_url(key)) == key
+
+
+def test_key_from_url_round_trips_endpoint_urls(s3_service, monkeypatch):
+    monkeypatch.setattr(s3_module, 'S3_ENDPOINT_URL', 'http://localhost:9000/')
+    key = 'profilepics/abc/me.png'
+    assert s3_service.public_url(key) == 'http://localhost:9000/test-bucket/profilepics/abc/me.png'
+    assert s3_service.key_from_url(s3_service.public_url(key)) == key
+
+
+def test_key_from_url_is_none_outside_the_bucket(s3_service):
+    assert s3_service.key_from_url(GOOGLE_PICTURE) is None
+    assert s3_service.key_from_url('https://other-bucket.s3.us-east-1.amazonaws.com/a.jpg') is None
+
+
+@pytest.mark.parametrize('url', [
+    'https://evil-test-bucket.s3.us-east-1.amazonaws.com/listings/a.jpg',
+    'https://test-bucket.s3.evil.com.s3.amazonaws.com/listings/a.jpg',
+    'https://test-bucket.s3.evil.com#.amazonaws.com/listings/a.jpg',
+    'https://example.com/?u=https://test-bucket.s3.us-east-1.amazonaws.com/listings/a.jpg',
+])
+def test_key_from_url_matches_only_our_host(s3_service, url):
+    assert s3_service.key_from_url(url) is None
+
+
+def test_key_from_url_accepts_the_global_endpoint(s3_service):
+    assert s3_service.key_from_url('https://test-bucket.s3.amazonaws.com/listings/a.jpg') == 'listings/a.jpg'
+    assert s3_service.image_keys(GOOGLE_PICTURE) == []
+
+
+def test_enqueue_skips_urls_outside_the_bucket(s3_service):
+    db = RecordingSession()
+    enqueue_image_deletions(db, [GOOGLE_PICTURE])
+    assert db.statements == []
+
+    enqueue_image_deletions(db, [GOOGLE_PICTURE, s3_service.public_url('profilepics/abc/me.png')])
+    assert len(db.statements) == 1
+    queued = set(db.statements[0].compile().params.values())
+    assert 'profilepics/abc/me.png' in queued
+    assert not any('googleusercontent' in str(value) for value in queued)
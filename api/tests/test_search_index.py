@@ -0,0 +1,93 @@
+import uuid
+from types import SimpleNamespace
+
+import services.search_service as search_service
+from services.pagination import decode_cursor
+from services.search_index import SearchIndex
+
+
+def make_index(count: int):
+    index = SearchIndex()
+    ids = [uuid.uuid4() for _ in range(count)]
+    for n, listing_id in enumerate(ids):
+        # Every listing matches; a few share a score so ties are broken by id
+        index.add(listing_id, 'desk lamp', 'lamp ' * (n % 7))
+    return index, ids
+
+
+def test_limit_and_after_match_the_full_ranking():
+    index, _ = make_index(300)
+    ranked = index.search('lamp')
+    assert ranked == sorted(ranked, key=lambda item: (-item[1], str(item[0])))
+    assert index.search('lamp', limit=10) == ranked[:10]
+
+    score, listing_id = ranked[41][1], ranked[41][0]
+    assert index.search('lamp', limit=10, after=(score, listing_id)) == ranked[42:52]
+
+
+class RowsDuringRebuild:
+    """Stands in for the rebuild query, running `during` once the table has been read"""
+
+    def __init__(self, rows, during):
+        self.rows, self.during = rows, during
+
+    def execution_options(self, **options):
+        return self
+
+    def __iter__(self):
+        yield from self.rows
+        self.during()
+
+
+def test_writes_during_a_rebuild_are_kept():
+    index = SearchIndex()
+    stale, kept, added = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    index.add(stale, 'old bike', '')
+    rows = [SimpleNamespace(id=kept, title='bike lock', description='', tags=None)]
+
+    def during():
+        index.add(added, 'new bike', '')
+        index.remove(kept)
+
+    index.rebuild(SimpleNamespace(query=lambda *columns: RowsDuringRebuild(rows, during)))
+    assert [listing_id for listing_id, _ in index.search('bike')] == [added]
+
+
+class FilteredQuery:
+    """Stands in for a filtered listings query, passing only `allowed` ids and counting lookups"""
+
+    def __init__(self, allowed):
+        self.allowed = allowed
+        self.lookups = 0
+        self._ids = []
+
+    def filter(self, criterion):
+        self.lookups += 1
+        self._ids = criterion.right.value
+        return self
+
+    def __iter__(self):
+        return iter(SimpleNamespace(id=listing_id) for listing_id in self._ids if listing_id in self.allowed)
+
+
+def test_selective_filters_check_a_bounded_number_of_candidates(monkeypatch):
+    index, ids = make_index(3000)
+    monkeypatch.setattr(search_service, 'get_search_index', lambda: index)
+    ranked = index.search('lamp')
+    allowed = {ranked[10][0], ranked[2500][0]}
+    query = FilteredQuery(allowed)
+
+    listings, cursor = search_service.memory_search_page(query, 'lamp', 20, None)
+    assert [listing.id for listing in listings] == [ranked[10][0]]
+    assert query.lookups == search_service.MEMORY_MAX_CANDIDATE_BATCHES
+
+    # The cursor resumes after the last candidate checked, not the last one returned
+    checked = search_service.MEMORY_CANDIDATE_BATCH * search_service.MEMORY_MAX_CANDIDATE_BATCHES
+    score, listing_id = decode_cursor(cursor, [float, uuid.UUID])
+    assert (listing_id, score) == ranked[checked - 1]
+
+    pages = [listings]
+    while cursor:
+        listings, cursor = search_service.memory_search_page(FilteredQuery(allowed), 'lamp', 20, cursor)
+        pages.append(listings)
+    assert [listing.id for page in pages for listing in page] == [ranked[10][0], ranked[2500][0]]
@@ -0,0 +1,143 @@
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from fastapi.testclient import TestClient
+
+from db.database import get_db
+from main import app
+from routers import account
+from routers.auth import verify_jwt_token
+from services.s3_service import MAX_IMAGE_SIZE, S3Service, get_s3_service
+
+JPEG_HEADER = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01'
+
+
+@pytest.fixture
+def s3_stub():
+    s3_service = get_s3_service()
+    with Stubber(s3_service.s3_client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def stub_upload(stubber, key, header=JPEG_HEADER, size=48213, content_type='image/jpeg', age=timedelta(minutes=1)):
+    stubber.add_response(
+        'get_object',
+        {
+            'Body': StreamingBody(io.BytesIO(header), len(header)),
+            'ContentLength': len(header),
+            'ContentRange': f'bytes 0-{len(header) - 1}/{size}',
+            'ContentType': content_type,
+            'LastModified': datetime.now(timezone.utc) - age,
+        },
+        {'Bucket': get_s3_service().bucket_name, 'Key': key, 'Range': 'bytes=0-11'}
+    )
+
+
+def test_verify_upload_accepts_an_image(s3_stub):
+    key = f'{S3Service.listing_upload_prefix("seller")}photo.jpg'
+    stub_upload(s3_stub, key)
+    assert get_s3_service().verify_upload(key, S3Service.listing_upload_prefix('seller')) == \
+        get_s3_service().public_url(key)
+
+
+def test_verify_upload_sniffs_the_leading_bytes(s3_stub):
+    key = f'{S3Service.listing_upload_prefix("seller")}photo.jpg'
+    stub_upload(s3_stub, key, header=b'<html><body>')
+    with pytest.raises(ValueError, match='not an image'):
+        get_s3_service().verify_upload(key, S3Service.listing_upload_prefix('seller'))
+
+
+def test_verify_upload_reads_the_full_size_from_the_range(s3_stub):
+    key = f'{S3Service.listing_upload_prefix("seller")}photo.jpg'
+    stub_upload(s3_stub, key, size=MAX_IMAGE_SIZE + 1)
+    with pytest.raises(ValueError, match='not an image'):
+        get_s3_service().verify_upload(key, S3Service.listing_upload_prefix('seller'))
+
+
+def test_verify_upload_rejects_missing_and_foreign_keys(s3_stub):
+    key = f'{S3Service.listing_upload_prefix("seller")}photo.jpg'
+    s3_stub.add_client_error('get_object', service_error_code='NoSuchKey', http_status_code=404)
+    with pytest.raises(ValueError, match='not found'):
+        get_s3_service().verify_upload(key, S3Service.listing_upload_prefix('seller'))
+    with pytest.raises(ValueError, match='Invalid upload key'):
+        get_s3_service().verify_upload(key, S3Service.listing_upload_prefix('someone-else'))
+
+
+class FakeSession:
+    """Just enough of a Session for upload_pfp: one user lookup and a commit"""
+
+    def __init__(self, user):
+        self.user = user
+        self.committed = False
+
+    def query(self, *entities):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        return self.user
+
+    def commit(self):
+        self.committed = True
+
+
+@pytest.fixture
+def client():
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def as_user(user_id, db):
+    app.dependency_overrides[verify_jwt_token] = lambda: {'uuid': user_id}
+    app.dependency_overrides[get_db] = lambda: db
+
+
+def test_upload_pfp_attaches_an_uploaded_key(client, s3_stub, monkeypatch):
+    user_id = str(uuid.uuid4())
+    db = FakeSession(SimpleNamespace(pfp_url=None))
+    as_user(user_id, db)
+    monkeypatch.setattr(account, 'claimed_uploads', lambda db, urls: set())
+
+    key = f'{S3Service.profile_picture_prefix(user_id)}me.jpg'
+    stub_upload(s3_stub, key)
+    response = client.put('/account/upload_pfp', data={'image_key': key})
+
+    assert response.status_code == 200, response.text
+    assert response.json()['pfp_url'] == [get_s3_service().public_url(key)]
+    assert db.user.pfp_url == [get_s3_service().public_url(key)]
+    assert db.committed
+
+
+def test_upload_pfp_rejects_a_key_that_is_already_attached(client, s3_stub, monkeypatch):
+    user_id = str(uuid.uuid4())
+    db = FakeSession(SimpleNamespace(pfp_url=None))
+    as_user(user_id, db)
+    monkeypatch.setattr(account, 'claimed_uploads', lambda db, urls: set(urls))
+
+    key = f'{S3Service.profile_picture_prefix(user_id)}me.jpg'
+    stub_upload(s3_stub, key)
+    response = client.put('/account/upload_pfp', data={'image_key': key})
+
+    assert response.status_code == 400
+    assert not db.committed
+
+
+def test_claimed_uploads_finds_attached_and_queued_urls(db, make_user, make_listing):
+    from services.deletion_queue import claimed_uploads, enqueue_keys
+
+    s3_service = get_s3_service()
+    listed, pfp, queued, free = (s3_service.public_url(f'listings/x/{name}.jpg')
+                                 for name in ('listed', 'pfp', 'queued', 'free'))
+    seller = make_user(pfp_url=[pfp])
+    make_listing(seller, images=[listed])
+    enqueue_keys(db, ['listings/x/queued.jpg'])
+
+    assert claimed_uploads(db, [listed, pfp, queued, free]) == {listed, pfp, queued}
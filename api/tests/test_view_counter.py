@@ -0,0 +1,57 @@
+import threading
+import uuid
+
+import services.view_counter as view_counter_module
+from services.view_counter import ViewCounter
+
+
+class BlockingSession:
+    """Stands in for a Session; the first execute waits until `release` is set"""
+
+    release = threading.Event()
+    started = threading.Event()
+    executes = 0
+
+    def execute(self, statement):
+        BlockingSession.executes += 1
+        if BlockingSession.executes == 1:
+            BlockingSession.started.set()
+            BlockingSession.release.wait(5)
+        return self
+
+    def all(self):
+        return []
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_a_flush_waits_for_the_one_already_running(monkeypatch):
+    monkeypatch.setattr(view_counter_module, 'SessionLocal', BlockingSession)
+    counter = ViewCounter()
+    listing_id = uuid.uuid4()
+    counter._remember(listing_id, uuid.uuid4(), 10)
+    counter.record(listing_id)
+
+    # A periodic flush still writing when shutdown flushes again
+    running = threading.Thread(target=counter.flush)
+    running.start()
+    assert BlockingSession.started.wait(5)
+    counter.record(listing_id)
+    final = threading.Thread(target=counter.flush)
+    final.start()
+    final.join(0.2)
+    assert final.is_alive()
+    # Both views are still shown while the first flush is in flight
+    assert counter.lookup(listing_id, None) == (counter._listings[listing_id][0], 12)
+
+    BlockingSession.release.set()
+    running.join(5)
+    final.join(5)
+    assert BlockingSession.executes == 2